@@ -1,4 +1,6 @@
-from rideboard_api import app
+from rideboard_api import create_app
+
+app = create_app()
 
 if __name__ == '__main__':
     app.run(host=app.config['IP'], port=int(app.config['PORT']))
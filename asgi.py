@@ -0,0 +1,4 @@
+from rideboard_api.asgi import application
+
+# Serve with an ASGI server, e.g. `uvicorn asgi:application`
+__all__ = ['application']
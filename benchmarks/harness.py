@@ -0,0 +1,243 @@
+"""
+Benchmark harness for the RideBoard API.
+
+Seeds a synthetic SQLite database, drives every API route through the Flask test client,
+then runs concurrent HTTP load against a local threaded server. Reports p50/p99 latency,
+throughput, SQL statements per request and the time to import and configure the app as JSON, for tracking regressions between releases.
+
+Usage: python benchmarks/harness.py [--rides N] [--cars N] [--riders N] [--iterations N]
+                                    [--concurrency N] [--http-requests N] [--output FILE]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from load import percentile, run as run_load
+from sandbox import prepare, load_app
+
+TIME_FORMAT = '%a, %d %b %Y %H:%M:%S'
+SEED_BATCH_SIZE = 500
+
+
+class StatementCounter:
+    """
+    Counts SQL statements executed by the current thread.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def __call__(self, *args):
+        self.local.count = getattr(self.local, 'count', 0) + 1
+
+    def reset(self):
+        self.local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self.local, 'count', 0)
+
+
+def synthetic_events(first: int, count: int, cars: int, riders: int) -> list:
+    """
+    Builds events in the /import format, starting a day apart from today
+    """
+    start = datetime.now().replace(microsecond=0)
+    events = []
+    for index in range(first, first + count):
+        begin = start + timedelta(days=index - first, hours=index % 24)
+        end = begin + timedelta(hours=4)
+        events.append({
+            'name': 'Event {}'.format(index),
+            'address': '1 Lomb Memorial Dr',
+            'start_time': begin.strftime(TIME_FORMAT),
+            'end_time': end.strftime(TIME_FORMAT),
+            'creator': 'creator{}'.format(index % 50),
+            'cars': [{
+                'name': 'Driver {}'.format(car),
+                'username': 'driver{}-{}'.format(index, car),
+                'departure_time': begin.strftime(TIME_FORMAT),
+                'return_time': end.strftime(TIME_FORMAT),
+                'max_capacity': riders + 1,
+                'riders': ['rider{}-{}-{}'.format(index, car, rider) for rider in range(riders)]
+            } for car in range(cars)]
+        })
+    return events
+
+
+def main():
+    # pylint: disable=too-many-locals,too-many-statements
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rides', type=int, default=1000)
+    parser.add_argument('--cars', type=int, default=3, help="cars per ride, besides Need a Ride")
+    parser.add_argument('--riders', type=int, default=3, help="riders per car")
+    parser.add_argument('--iterations', type=int, default=50, help="requests per route through the test client")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--http-requests', type=int, default=1000, help="0 skips the HTTP load test")
+    parser.add_argument('--response-cache', action='store_true',
+                        help="keep the response cache on, by default every read is rendered")
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    db_path = prepare()
+    # pylint: disable=import-error
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from werkzeug.serving import make_server
+    # Importing the package builds the app, so time it before anything else pulls it in
+    startup_start = time.perf_counter()
+    # Serve every host name, the HTTP load test connects to 127.0.0.1, and measure the routes,
+    # not (unless asked) the response cache
+    rideboard_api = load_app(SERVER_NAME=None, **({} if args.response_cache else {'RESPONSE_CACHE_TTL': 0}))
+    app = rideboard_api.app
+    startup_seconds = time.perf_counter() - startup_start
+    from rideboard_api import db
+    from rideboard_api.bulk import import_events
+    from rideboard_api.models import APIKey
+
+    counter = StatementCounter()
+    event.listen(Engine, 'after_cursor_execute', counter)
+
+    with app.app_context():
+        db.create_all()
+        key = APIKey('benchmark', 'harness.py')
+        db.session.add(key)
+        db.session.commit()
+        api_key = key.key
+        seed_start = time.perf_counter()
+        ride_ids = []
+        for first in range(0, args.rides, SEED_BATCH_SIZE):
+            count = min(SEED_BATCH_SIZE, args.rides - first)
+            ride_ids += import_events(synthetic_events(first, count, args.cars, args.riders))['ride_ids']
+        seed_seconds = time.perf_counter() - seed_start
+
+    client = app.test_client()
+    ride_id = ride_ids[len(ride_ids) // 2]
+    cars = json.loads(client.get('/{}/all?id={}'.format(api_key, ride_id)).data.decode())[0]['cars']
+    car_id = cars[0]['id']
+    rider = [username for car in cars for username in car['riders']][0]
+    # Event with a car big enough for every join
+    host = json.loads(client.post('/{}/create/event'.format(api_key), data=json.dumps({
+        'name': 'Benchmark', 'address': 'Here', 'creator': 'benchmark',
+        'start_time': datetime.now().strftime(TIME_FORMAT),
+        'end_time': (datetime.now() + timedelta(hours=1)).strftime(TIME_FORMAT)}),
+                                  content_type='application/json').data.decode())
+    host_car = json.loads(client.post('/{}/create/car/{}'.format(api_key, host['id']), data=json.dumps({
+        'name': 'Bus', 'username': 'bus', 'max_capacity': 10 ** 6,
+        'departure_time': datetime.now().strftime(TIME_FORMAT),
+        'return_time': datetime.now().strftime(TIME_FORMAT)}), content_type='application/json').data.decode())
+    bus_id = [car['id'] for car in host_car['cars'] if car['username'] == 'bus'][0]
+    created_events = []
+
+    def new_event(i):
+        return {'data': json.dumps({
+            'name': 'Created {}'.format(i), 'address': 'There', 'creator': 'benchmark',
+            'start_time': datetime.now().strftime(TIME_FORMAT),
+            'end_time': datetime.now().strftime(TIME_FORMAT)}), 'content_type': 'application/json'}
+
+    def new_car(i):
+        return {'data': json.dumps({
+            'name': 'Driver', 'username': 'bench{}'.format(i), 'max_capacity': 4,
+            'departure_time': datetime.now().strftime(TIME_FORMAT),
+            'return_time': datetime.now().strftime(TIME_FORMAT)}), 'content_type': 'application/json'}
+
+    def batch(i):
+        usernames = ['batch{}-{}'.format(i, n) for n in range(5)]
+        return {'data': json.dumps(
+            [{'action': 'join', 'car_id': bus_id, 'username': username} for username in usernames] +
+            [{'action': 'leave', 'event_id': host['id'], 'username': username} for username in usernames]),
+                'content_type': 'application/json'}
+
+    def imported(i):
+        return {'data': json.dumps(synthetic_events(10 ** 6 + i * 10, 10, args.cars, args.riders)),
+                'content_type': 'application/json'}
+
+    # (name, method, path builder, request kwargs builder), in an order that leaves the data as it found it
+    routes = [
+        ('index', 'GET', lambda i: '/', None),
+        ('healthz', 'GET', lambda i: '/healthz', None),
+        ('metrics', 'GET', lambda i: '/metrics', None),
+        ('all', 'GET', lambda i: '/{}/all'.format(api_key), None),
+        ('all?id', 'GET', lambda i: '/{}/all?id={}'.format(api_key, ride_id), None),
+        ('all?upcoming&limit=25', 'GET', lambda i: '/{}/all?upcoming=true&limit=25'.format(api_key), None),
+        ('all?fields', 'GET', lambda i: '/{}/all?fields=id,name,open_seats'.format(api_key), None),
+        ('get/car', 'GET', lambda i: '/{}/get/car'.format(api_key), None),
+        ('get/car?id', 'GET', lambda i: '/{}/get/car?id={}'.format(api_key, car_id), None),
+        ('upcoming', 'GET', lambda i: '/{}/upcoming'.format(api_key), None),
+        ('user', 'GET', lambda i: '/{}/user/{}'.format(api_key, rider), None),
+        ('user?ride_id', 'GET', lambda i: '/{}/user/{}?ride_id={}'.format(api_key, rider, ride_id), None),
+        ('export', 'GET', lambda i: '/{}/export'.format(api_key), None),
+        ('export/cars (CSV)', 'GET', lambda i: '/{}/export/cars'.format(api_key), None),
+        ('export/seats (CSV)', 'GET', lambda i: '/{}/export/seats'.format(api_key), None),
+        ('join', 'PUT', lambda i: '/{}/join/{}/joiner{}/First/Last'.format(api_key, bus_id, i), None),
+        ('leave', 'PUT', lambda i: '/{}/leave/{}/joiner{}'.format(api_key, host['id'], i), None),
+        ('batch (5 joins, 5 leaves)', 'POST', lambda i: '/{}/batch'.format(api_key), batch),
+        ('create/car', 'POST', lambda i: '/{}/create/car/{}'.format(api_key, host['id']), new_car),
+        ('delete/car', 'DELETE', lambda i: '/{}/delete/car/{}/bench{}'.format(api_key, host['id'], i), None),
+        ('create/event', 'POST', lambda i: '/{}/create/event'.format(api_key), new_event),
+        ('delete/event', 'DELETE', lambda i: '/{}/delete/event/{}/benchmark'.format(api_key, created_events[i]),
+         None),
+        ('import (10 events)', 'POST', lambda i: '/{}/import'.format(api_key), imported),
+    ]
+
+    report = {
+        'dataset': {'rides': args.rides, 'cars_per_ride': args.cars + 1, 'riders_per_car': args.riders,
+                    'seed_seconds': round(seed_seconds, 3)},
+        'routes': {},
+        'startup_seconds': round(startup_seconds, 3),
+    }
+    for name, method, path, kwargs in routes:
+        latencies = []
+        statements = []
+        statuses = {}
+        for i in range(args.iterations):
+            counter.reset()
+            begin = time.perf_counter()
+            response = client.open(path(i), method=method, **(kwargs(i) if kwargs else {}))
+            response.get_data()
+            latencies.append(time.perf_counter() - begin)
+            statements.append(counter.count)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if name == 'create/event' and response.status_code == 200:
+                created_events.append(json.loads(response.data.decode())['id'])
+        total = sum(latencies)
+        report['routes'][name] = {
+            'requests': len(latencies),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'throughput': round(len(latencies) / total, 1) if total else 0.0,
+            'sql_per_request': round(sum(statements) / len(statements), 2),
+            'sql_max': max(statements),
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        }
+
+    if args.http_requests > 0:
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        base = 'http://127.0.0.1:{}'.format(server.server_port)
+        report['http'] = {
+            'all?upcoming&limit=25': run_load(['{}/{}/all?upcoming=true&limit=25'.format(base, api_key)],
+                                             args.concurrency, args.http_requests, False),
+            'upcoming': run_load(['{}/{}/upcoming'.format(base, api_key)],
+                                 args.concurrency, args.http_requests, False),
+            'upcoming (If-None-Match)': run_load(['{}/{}/upcoming'.format(base, api_key)],
+                                                 args.concurrency, args.http_requests, True),
+        }
+        server.shutdown()
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Compares query plans and latency of the API's hot lookups with and without the
+indexes from migrations/001_lookup_indexes.sql, on a seeded SQLite database.
+
+Usage: python benchmarks/indexes.py [--rides N] [--cars N] [--riders N] [--repeat N]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+MIGRATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'migrations', '001_lookup_indexes.sql')
+
+SCHEMA = """
+CREATE TABLE rides (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(150) NOT NULL,
+    address TEXT NOT NULL,
+    start_time DATETIME NOT NULL,
+    end_time DATETIME NOT NULL,
+    creator VARCHAR(50) NOT NULL
+);
+CREATE TABLE cars (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(80) NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    current_capacity INTEGER NOT NULL,
+    max_capacity INTEGER NOT NULL,
+    departure_time DATETIME NOT NULL,
+    return_time DATETIME NOT NULL,
+    driver_comment TEXT,
+    ride_id INTEGER NOT NULL REFERENCES rides (id)
+);
+CREATE TABLE riders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(80) NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    car_id INTEGER NOT NULL REFERENCES cars (id)
+);
+"""
+
+# (label, sql, function building parameters from the seeded sizes)
+QUERIES = [
+    ("upcoming_event", "SELECT * FROM rides WHERE start_time >= ? ORDER BY start_time LIMIT 1",
+     lambda s: (datetime(2018, 1, 1) + timedelta(hours=random.randrange(s['rides'])),)),
+    ("join_car: driver check", "SELECT id FROM cars WHERE ride_id = ? AND username = ?",
+     lambda s: (random.randrange(1, s['rides'] + 1), 'user{}'.format(random.randrange(s['users'])))),
+    ("join_car: rider check",
+     "SELECT riders.id FROM riders JOIN cars ON riders.car_id = cars.id WHERE cars.ride_id = ? AND riders.username = ?",
+     lambda s: (random.randrange(1, s['rides'] + 1), 'user{}'.format(random.randrange(s['users'])))),
+    ("leave_ride", "SELECT id FROM riders WHERE car_id = ? AND username = ?",
+     lambda s: (random.randrange(1, s['cars'] + 1), 'user{}'.format(random.randrange(s['users'])))),
+    ("delete_car", "SELECT id FROM cars WHERE username = ? AND ride_id = ?",
+     lambda s: ('user{}'.format(random.randrange(s['users'])), random.randrange(1, s['rides'] + 1))),
+    ("cars of a ride", "SELECT * FROM cars WHERE ride_id = ?",
+     lambda s: (random.randrange(1, s['rides'] + 1),)),
+    ("rides of a user", "SELECT car_id FROM riders WHERE username = ?",
+     lambda s: ('user{}'.format(random.randrange(s['users'])),)),
+]
+
+
+def seed(conn, rides, cars_per_ride, riders_per_car, users):
+    start = datetime(2018, 1, 1)
+    conn.executemany("INSERT INTO rides (id, name, address, start_time, end_time, creator) VALUES (?, ?, ?, ?, ?, ?)",
+                     ((i, 'Event {}'.format(i), 'Address', start + timedelta(hours=i),
+                       start + timedelta(hours=i + 4), 'user{}'.format(i % users)) for i in range(1, rides + 1)))
+    car_rows = []
+    rider_rows = []
+    car_id = 0
+    for ride_id in range(1, rides + 1):
+        for _ in range(cars_per_ride):
+            car_id += 1
+            when = start + timedelta(hours=ride_id)
+            car_rows.append((car_id, 'user{}'.format(random.randrange(users)), 'Driver', riders_per_car,
+                             riders_per_car + 1, when, when, '', ride_id))
+            rider_rows.extend(('user{}'.format(random.randrange(users)), 'Rider', car_id)
+                              for _ in range(riders_per_car))
+    conn.executemany("INSERT INTO cars (id, username, name, current_capacity, max_capacity, departure_time, "
+                     "return_time, driver_comment, ride_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", car_rows)
+    conn.executemany("INSERT INTO riders (username, name, car_id) VALUES (?, ?, ?)", rider_rows)
+    conn.commit()
+    return car_id
+
+
+def run(conn, sizes, repeat):
+    results = {}
+    for label, sql, params in QUERIES:
+        plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params(sizes)).fetchall()
+        begin = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, params(sizes)).fetchall()
+        elapsed = (time.perf_counter() - begin) / repeat
+        results[label] = (elapsed, ' / '.join(row[-1] for row in plan))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rides', type=int, default=5000)
+    parser.add_argument('--cars', type=int, default=5, help="cars per ride")
+    parser.add_argument('--riders', type=int, default=3, help="riders per car")
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(0)
+    conn = sqlite3.connect(':memory:')
+    conn.executescript(SCHEMA)
+    total_cars = seed(conn, args.rides, args.cars, args.riders, args.users)
+    sizes = {'rides': args.rides, 'cars': total_cars, 'users': args.users}
+
+    before = run(conn, sizes, args.repeat)
+    with open(MIGRATION) as f:
+        conn.executescript(f.read())
+    conn.execute("ANALYZE")
+    after = run(conn, sizes, args.repeat)
+
+    print("{} rides, {} cars, {} riders".format(args.rides, total_cars, total_cars * args.riders))
+    for label, _, _ in QUERIES:
+        print("\n{}".format(label))
+        print("  no index: {:9.1f} us  {}".format(before[label][0] * 1e6, before[label][1]))
+        print("  indexed:  {:9.1f} us  {}".format(after[label][0] * 1e6, after[label][1]))
+
+
+if __name__ == '__main__':
+    main()
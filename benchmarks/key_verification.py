@@ -0,0 +1,89 @@
+"""
+Measures the per request cost of API key verification: the digest alone, check_key with the key cache
+off (prefix lookup and constant time compare) for valid and invalid keys, check_key on a cache hit,
+and, as the baseline, the plaintext equality query keys were checked with before they were hashed.
+
+Runs against a throwaway SQLite database.
+
+Usage: python benchmarks/key_verification.py [--keys N] [--repeat N]
+"""
+import argparse
+import os
+import random
+import time
+
+from sandbox import prepare, load_app
+
+
+def measure(function, arguments: list) -> dict:
+    latencies = []
+    for argument in arguments:
+        begin = time.perf_counter()
+        function(argument)
+        latencies.append(time.perf_counter() - begin)
+    latencies.sort()
+    return {
+        'p50_us': round(latencies[len(latencies) // 2] * 10 ** 6, 1),
+        'p99_us': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 10 ** 6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, default=10000, help="keys in the database")
+    parser.add_argument('--repeat', type=int, default=5000, help="verifications per measurement")
+    args = parser.parse_args()
+
+    db_path = prepare()
+    # pylint: disable=import-error
+    from sqlalchemy import text
+    load_app()
+    from rideboard_api import app, db, check_key, key_cache
+    from rideboard_api.keys import key_digest
+    from rideboard_api.models import APIKey
+
+    with app.app_context():
+        db.create_all()
+        keys = [APIKey('benchmark', 'key {}'.format(i)) for i in range(args.keys)]
+        db.session.add_all(keys)
+        plaintext = [key.key for key in keys]
+        db.session.execute(text('CREATE TABLE plaintext_keys (hash VARCHAR(64) UNIQUE)'))
+        db.session.execute(text('INSERT INTO plaintext_keys (hash) VALUES (:hash)'),
+                           [{'hash': key} for key in plaintext])
+        db.session.commit()
+
+    valid = [random.choice(plaintext) for _ in range(args.repeat)]
+    invalid = ['{:032x}'.format(random.getrandbits(128)) for _ in range(args.repeat)]
+
+    def verify(api_key):
+        # A fresh request each time, so check_key's per request shortcut doesn't apply
+        with app.test_request_context():
+            return check_key(api_key)
+
+    def plaintext_lookup(api_key):
+        with app.test_request_context():
+            return db.session.execute(text('SELECT EXISTS (SELECT 1 FROM plaintext_keys WHERE hash = :hash)'),
+                                      {'hash': api_key}).scalar()
+
+    results = {
+        'digest': measure(key_digest, valid),
+        'plaintext query (before)': measure(plaintext_lookup, valid),
+    }
+    ttl, negative_ttl = key_cache.ttl, key_cache.negative_ttl
+    key_cache.ttl = key_cache.negative_ttl = 0
+    results['check_key, valid, no cache'] = measure(verify, valid)
+    results['check_key, invalid, no cache'] = measure(verify, invalid)
+    key_cache.ttl, key_cache.negative_ttl = ttl, negative_ttl
+    key_cache.max_size = len(set(valid))
+    for api_key in set(valid):
+        verify(api_key)
+    results['check_key, valid, cached'] = measure(verify, valid)
+
+    print("{} keys, {} verifications each".format(args.keys, args.repeat))
+    for label, result in results.items():
+        print("{:32} p50 {:>8} us   p99 {:>8} us".format(label, result['p50_us'], result['p99_us']))
+    os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Concurrent HTTP load generator. Sends GET requests to a running server from a pool of threads
+and reports latency percentiles and throughput as JSON.
+
+Compare the serving modes by running the same load against both, e.g.:
+    gunicorn -w 4 --threads 8 app:application    -> python benchmarks/load.py http://localhost:8000/KEY/all
+    uvicorn --workers 4 asgi:application         -> python benchmarks/load.py http://localhost:8000/KEY/all
+
+Usage: python benchmarks/load.py URL [URL ...] [--concurrency N] [--requests N] [--etag]
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def run(urls: list, concurrency: int, requests: int, use_etag: bool) -> dict:
+    """
+    Sends requests to the URLs round robin from concurrency threads
+    :return: dict of latency percentiles in milliseconds, throughput and status counts
+    """
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(requests))
+    etags = {}
+
+    def worker():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            url = urls[index % len(urls)]
+            request = urllib.request.Request(url)
+            if use_etag and url in etags:
+                request.add_header('If-None-Match', etags[url])
+            begin = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+                    status = response.status
+                    etag = response.headers.get('ETag')
+            except urllib.error.HTTPError as e:
+                status = e.code
+                etag = None
+            elapsed = time.perf_counter() - begin
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+                if etag is not None:
+                    etags[url] = etag
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    begin = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - begin
+    return {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('urls', nargs='+')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--etag', action='store_true', help="send If-None-Match like a polling client")
+    args = parser.parse_args()
+    print(json.dumps(run(args.urls, args.concurrency, args.requests, args.etag), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Setup shared by the benchmarks and the tests: a throwaway SQLite database for the app to import against,
+with the rate limiter off so they measure the routes.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def prepare(keep_database_uri=False) -> str:
+    """
+    Points the app at a new SQLite database and makes rideboard_api importable from the repository root.
+    Call it before importing rideboard_api, which reads its config at import.
+    :param keep_database_uri: use SQLALCHEMY_DATABASE_URI instead if it is already set
+    :return: path of the database file, to delete when done
+    """
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db_file.close()
+    if not keep_database_uri or 'SQLALCHEMY_DATABASE_URI' not in os.environ:
+        os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_file.name
+    os.chdir(ROOT)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    return db_file.name
+
+
+def load_app(**config):
+    """
+    Imports rideboard_api and configures its app
+    :param config: settings passed to create_app
+    :return: the rideboard_api package
+    """
+    # pylint: disable=import-error
+    import rideboard_api
+    rideboard_api.create_app(**dict(config, RATE_LIMIT_RATE=0))
+    return rideboard_api
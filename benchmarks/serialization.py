@@ -0,0 +1,117 @@
+"""
+Compares the old jsonify serialization path (pretty-printed, sorted keys, Flask 0.12 defaults)
+with rideboard_api.serializers on a synthetic dataset.
+
+Usage: python benchmarks/serialization.py [--rides N] [--cars N] [--riders N] [--repeat N]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+FakeRide = namedtuple('FakeRide', 'id name address start_time end_time creator open_seats cars')
+FakeCar = namedtuple('FakeCar', 'id name username current_capacity max_capacity departure_time return_time '
+                                'driver_comment ride_id riders')
+FakeRider = namedtuple('FakeRider', 'username')
+
+
+def load_serializers():
+    # Loaded from its file so the benchmark doesn't need the app's config, database or SSO
+    spec = importlib.util.spec_from_file_location('serializers', os.path.join(ROOT, 'rideboard_api', 'serializers.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build(rides, cars_per_ride, riders_per_car):
+    start = datetime(2018, 8, 2, 6, 13)
+    data = []
+    car_id = 0
+    for ride_id in range(1, rides + 1):
+        cars = []
+        for _ in range(cars_per_ride):
+            car_id += 1
+            cars.append(FakeCar(car_id, 'Driver Name', 'driver{}'.format(car_id), riders_per_car, riders_per_car + 1,
+                                start, start + timedelta(hours=4), 'No comments provided.', ride_id,
+                                [FakeRider('rider{}'.format(i)) for i in range(riders_per_car)]))
+        data.append(FakeRide(ride_id, 'Event {}'.format(ride_id), '1 Lomb Memorial Dr', start,
+                             start + timedelta(hours=4), 'creator', cars_per_ride, cars))
+    return data
+
+
+def car_dict(car, fields=None):
+    result = {
+        'id': car.id, 'name': car.name, 'username': car.username, 'current_capacity': car.current_capacity,
+        'max_capacity': car.max_capacity, 'departure_time': car.departure_time, 'return_time': car.return_time,
+        'driver_comment': car.driver_comment, 'ride_id': car.ride_id,
+    }
+    if fields is None or 'riders' in fields:
+        result['riders'] = [rider.username for rider in car.riders]
+    return result
+
+
+def event_dict(ride, fields=None):
+    result = {
+        'id': ride.id, 'name': ride.name, 'address': ride.address, 'start_time': ride.start_time,
+        'end_time': ride.end_time, 'creator': ride.creator, 'open_seats': ride.open_seats,
+    }
+    if fields is None or 'cars' in fields:
+        result['cars'] = [car_dict(car) for car in ride.cars]
+    if fields is not None:
+        result = {key: value for key, value in result.items() if key in fields}
+    return result
+
+
+def timed(func, repeat):
+    best = None
+    size = 0
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        size = len(func())
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rides', type=int, default=10000)
+    parser.add_argument('--cars', type=int, default=3, help="cars per ride")
+    parser.add_argument('--riders', type=int, default=3, help="riders per car")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    serializers = load_serializers()
+    rides = build(args.rides, args.cars, args.riders)
+
+    def old_path():
+        # What Flask 0.12's jsonify did: indent=2, sorted keys, HTTP dates
+        return json.dumps([event_dict(ride) for ride in rides], indent=2, sort_keys=True,
+                          default=serializers.http_date).encode('utf-8')
+
+    cases = [("jsonify (Flask 0.12 defaults)", old_path)]
+    backends = ['json'] + (['orjson'] if serializers.orjson is not None else [])
+    for backend in backends:
+        for datetime_format in ('http', 'iso'):
+            serializer = serializers.Serializer(backend, datetime_format)
+            cases.append(("{} / {}".format(backend, datetime_format),
+                          lambda s=serializer: s.dumps([event_dict(ride) for ride in rides])))
+    fields = serializers.parse_fields('id,name,open_seats')
+    serializer = serializers.Serializer('auto', 'http')
+    cases.append(("{} / fields=id,name,open_seats".format(serializer.backend),
+                  lambda: serializer.dumps([event_dict(ride, fields) for ride in rides])))
+
+    print("{} rides, {} cars per ride, {} riders per car (best of {})".format(
+        args.rides, args.cars, args.riders, args.repeat))
+    for label, func in cases:
+        elapsed, size = timed(func, args.repeat)
+        print("{:40} {:8.1f} ms {:10.1f} KiB".format(label, elapsed * 1000, size / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,65 @@ SERVER_NAME = env.get('SERVER_NAME', 'rideboard-api.csh.rit.edu')
 SQLALCHEMY_DATABASE_URI = env.get('SQLALCHEMY_DATABASE_URI')
 SQLALCHEMY_TRACK_MODIFICATIONS = 'False'
 
+# Connection pool, ignored for SQLite (so not Flask-SQLAlchemy's SQLALCHEMY_POOL_* keys, which it passes to SQLite).
+# STATEMENT_TIMEOUT is in milliseconds, PostgreSQL only, 0 disables it.
+DATABASE_POOL_SIZE = int(env.get('DATABASE_POOL_SIZE', 5))
+DATABASE_MAX_OVERFLOW = int(env.get('DATABASE_MAX_OVERFLOW', 10))
+DATABASE_POOL_TIMEOUT = int(env.get('DATABASE_POOL_TIMEOUT', 30))
+DATABASE_POOL_RECYCLE = int(env.get('DATABASE_POOL_RECYCLE', 1800))
+DATABASE_POOL_PRE_PING = env.get('DATABASE_POOL_PRE_PING', 'True') == 'True'
+DATABASE_STATEMENT_TIMEOUT = int(env.get('DATABASE_STATEMENT_TIMEOUT', 0))
+# Optional read replica for the read only routes. They read from the primary instead for
+# DATABASE_REPLICA_LAG seconds after any write, so they never see, or cache, data from before it.
+DATABASE_READ_REPLICA_URI = env.get('DATABASE_READ_REPLICA_URI')
+DATABASE_REPLICA_LAG = float(env.get('DATABASE_REPLICA_LAG', 5))
+
+# asyncpg pool of the ASGI serving mode (asgi.py), PostgreSQL only
+ASYNC_POOL_MIN_SIZE = int(env.get('ASYNC_POOL_MIN_SIZE', 2))
+ASYNC_POOL_MAX_SIZE = int(env.get('ASYNC_POOL_MAX_SIZE', 20))
+
+# API key verification cache, per worker. Creating or revoking a key clears it on every worker.
+KEY_CACHE_SIZE = int(env.get('KEY_CACHE_SIZE', 1024))
+KEY_CACHE_TTL = int(env.get('KEY_CACHE_TTL', 300))
+KEY_CACHE_NEGATIVE_SIZE = int(env.get('KEY_CACHE_NEGATIVE_SIZE', 4096))
+KEY_CACHE_NEGATIVE_TTL = int(env.get('KEY_CACHE_NEGATIVE_TTL', 10))
+
+# GET response cache, per worker. Writes on other workers become visible after at most RESPONSE_CACHE_TTL seconds.
+RESPONSE_CACHE_SIZE = int(env.get('RESPONSE_CACHE_SIZE', 256))
+RESPONSE_CACHE_TTL = int(env.get('RESPONSE_CACHE_TTL', 30))
+
+# Requests slower than this many seconds are logged with their SQL statements
+SLOW_REQUEST_THRESHOLD = float(env.get('SLOW_REQUEST_THRESHOLD', 1.0))
+
+# Per API key rate limit: RATE_LIMIT_RATE requests per second with bursts of up to RATE_LIMIT_BURST, 0 disables it.
+# Storage is 'memory' (per worker) or a redis:// URL shared by every worker.
+RATE_LIMIT_RATE = float(env.get('RATE_LIMIT_RATE', 0))
+RATE_LIMIT_BURST = int(env.get('RATE_LIMIT_BURST', 50))
+RATE_LIMIT_STORAGE = env.get('RATE_LIMIT_STORAGE', 'memory')
+
+# JSON responses: backend is 'auto' (orjson if installed), 'orjson' or 'json'; datetimes are 'http' or 'iso'
+JSON_BACKEND = env.get('JSON_BACKEND', 'auto')
+JSON_DATETIME_FORMAT = env.get('JSON_DATETIME_FORMAT', 'http')
+
+# Next UPCOMING_CACHE_SIZE rides kept in memory for /upcoming, per worker
+UPCOMING_CACHE_SIZE = int(env.get('UPCOMING_CACHE_SIZE', 20))
+UPCOMING_CACHE_TTL = int(env.get('UPCOMING_CACHE_TTL', 60))
+
+# Background jobs. worker.py archives rides ARCHIVE_AFTER_DAYS after they end, ARCHIVE_BATCH_SIZE per transaction,
+# and recomputes open_seats; each web worker refills its caches every CACHE_WARM_INTERVAL seconds. 0 disables a job.
+ARCHIVE_INTERVAL = int(env.get('ARCHIVE_INTERVAL', 3600))
+ARCHIVE_AFTER_DAYS = int(env.get('ARCHIVE_AFTER_DAYS', 0))
+ARCHIVE_BATCH_SIZE = int(env.get('ARCHIVE_BATCH_SIZE', 500))
+RECONCILE_INTERVAL = int(env.get('RECONCILE_INTERVAL', 3600))
+CACHE_WARM_INTERVAL = int(env.get('CACHE_WARM_INTERVAL', 0))
+
+# Server-sent events stream
+EVENT_STREAM_HEARTBEAT = int(env.get('EVENT_STREAM_HEARTBEAT', 15))
+EVENT_STREAM_QUEUE_SIZE = int(env.get('EVENT_STREAM_QUEUE_SIZE', 100))
+
+# Secret of the HMAC API keys are stored as. Changing it invalidates every key.
+API_KEY_SECRET = env.get('API_KEY_SECRET', '')
+
 # Openshift secret
 SECRET_KEY = env.get("SECRET_KEY", default=''.join(secrets.token_hex(16)))
 
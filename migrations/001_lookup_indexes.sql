@@ -0,0 +1,11 @@
+-- Indexes on the columns the API filters and sorts on.
+-- Matches the index definitions in rideboard_api/models.py, for databases created before they existed.
+-- Works on PostgreSQL (9.5+) and SQLite.
+
+CREATE INDEX IF NOT EXISTS ix_rides_start_time ON rides (start_time);
+
+CREATE INDEX IF NOT EXISTS ix_cars_username ON cars (username);
+CREATE INDEX IF NOT EXISTS ix_cars_ride_id_username ON cars (ride_id, username);
+
+CREATE INDEX IF NOT EXISTS ix_riders_username ON riders (username);
+CREATE INDEX IF NOT EXISTS ix_riders_car_id_username ON riders (car_id, username);
@@ -0,0 +1,12 @@
+-- Materialized open seat count per ride, maintained by the write routes.
+-- Run `FLASK_APP=app.py flask reconcile-seats` at any time to recompute it from the cars table.
+
+ALTER TABLE rides ADD COLUMN open_seats INTEGER NOT NULL DEFAULT 0;
+
+UPDATE rides SET open_seats = COALESCE((
+    SELECT SUM(cars.max_capacity - cars.current_capacity)
+    FROM cars
+    WHERE cars.ride_id = rides.id AND cars.max_capacity > 0
+), 0);
+
+CREATE INDEX IF NOT EXISTS ix_rides_open_seats ON rides (open_seats);
@@ -0,0 +1,12 @@
+-- Riders carry the ride_id of their car, so (ride_id, username) can be unique:
+-- a user can only ride in one car per event, even under concurrent joins.
+-- Remove any duplicate riders in an event before running this.
+
+ALTER TABLE riders ADD COLUMN ride_id INTEGER REFERENCES rides (id);
+
+UPDATE riders SET ride_id = (SELECT cars.ride_id FROM cars WHERE cars.id = riders.car_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS unique_rider ON riders (ride_id, username);
+
+-- PostgreSQL only, SQLite can't add NOT NULL to an existing column:
+-- ALTER TABLE riders ALTER COLUMN ride_id SET NOT NULL;
@@ -0,0 +1,39 @@
+-- History tables for archived rides, filled by `flask archive-rides` and `/delete/event?archive=true`.
+-- Rows keep the ids they had in the live tables.
+
+CREATE TABLE IF NOT EXISTS rides_history (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(150) NOT NULL,
+    address TEXT NOT NULL,
+    start_time TIMESTAMP NOT NULL,
+    end_time TIMESTAMP NOT NULL,
+    creator VARCHAR(50) NOT NULL,
+    open_seats INTEGER NOT NULL,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_rides_history_start_time ON rides_history (start_time);
+
+CREATE TABLE IF NOT EXISTS cars_history (
+    id INTEGER PRIMARY KEY,
+    username VARCHAR(80) NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    current_capacity INTEGER NOT NULL,
+    max_capacity INTEGER NOT NULL,
+    departure_time TIMESTAMP NOT NULL,
+    return_time TIMESTAMP NOT NULL,
+    driver_comment TEXT,
+    ride_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_cars_history_username ON cars_history (username);
+CREATE INDEX IF NOT EXISTS ix_cars_history_ride_id ON cars_history (ride_id);
+
+CREATE TABLE IF NOT EXISTS riders_history (
+    id INTEGER PRIMARY KEY,
+    username VARCHAR(80) NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    car_id INTEGER NOT NULL,
+    ride_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_riders_history_username ON riders_history (username);
+CREATE INDEX IF NOT EXISTS ix_riders_history_car_id ON riders_history (car_id);
+CREATE INDEX IF NOT EXISTS ix_riders_history_ride_id ON riders_history (ride_id);
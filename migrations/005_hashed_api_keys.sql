@@ -0,0 +1,9 @@
+-- API keys are stored as their first 8 characters and an HMAC-SHA256 digest keyed with API_KEY_SECRET.
+-- After this, run `FLASK_APP=app.py flask hash-api-keys` with API_KEY_SECRET set to fill them in from the
+-- plaintext keys, then 006_drop_plaintext_api_keys.sql.
+
+ALTER TABLE "APIKey" ADD COLUMN prefix VARCHAR(8);
+ALTER TABLE "APIKey" ADD COLUMN digest VARCHAR(64);
+
+CREATE INDEX IF NOT EXISTS "ix_APIKey_prefix" ON "APIKey" (prefix);
+CREATE UNIQUE INDEX IF NOT EXISTS "uq_APIKey_digest" ON "APIKey" (digest);
@@ -0,0 +1,9 @@
+-- Drops the plaintext API keys, once `flask hash-api-keys` has run. Keys not hashed by then stop working.
+
+DELETE FROM "APIKey" WHERE digest IS NULL;
+
+ALTER TABLE "APIKey" DROP COLUMN hash;
+
+-- PostgreSQL only, SQLite can't add NOT NULL to an existing column:
+-- ALTER TABLE "APIKey" ALTER COLUMN prefix SET NOT NULL;
+-- ALTER TABLE "APIKey" ALTER COLUMN digest SET NOT NULL;
@@ -0,0 +1,9 @@
+-- Write counter shared by every worker. Each write bumps it and cached responses built at an older
+-- version are dropped, so a worker never serves data from before another worker's write.
+
+CREATE TABLE IF NOT EXISTS cache_version (
+    id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO cache_version (id, version) VALUES (1, 0);
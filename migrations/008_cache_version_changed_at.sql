@@ -0,0 +1,4 @@
+-- Time of the last write, so the read routes use the primary database instead of the read replica
+-- for DATABASE_REPLICA_LAG seconds after it.
+
+ALTER TABLE cache_version ADD COLUMN changed_at DOUBLE PRECISION NOT NULL DEFAULT 0;
@@ -0,0 +1,4 @@
+-- Count of API keys created and revoked. Each worker caches key verifications only while it is unchanged,
+-- so a revoked key stops working on every worker at once.
+
+ALTER TABLE cache_version ADD COLUMN key_version INTEGER NOT NULL DEFAULT 0;
@@ -7,12 +7,18 @@
 # API keys.                             #
 #########################################
 import os
+import queue
+import time
 from datetime import datetime
+from functools import wraps
 import markdown
-from flask import Flask, request, jsonify, redirect
+from flask import Flask, Response, g, request, redirect, make_response, has_request_context
 from flask_cors import cross_origin
-from flask_pyoidc.flask_pyoidc import OIDCAuthentication
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event as sa_event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from rideboard_api.database import RideBoardSQLAlchemy, READ_ENDPOINTS
+from rideboard_api.oidc import LazyOIDCAuthentication
 
 # Setting up Flask
 app = Flask(__name__)
@@ -23,62 +29,310 @@ if os.path.exists(os.path.join(os.getcwd(), "config.py")):
 else:
     app.config.from_pyfile(os.path.join(os.getcwd(), "config.env.py"))
 
-db = SQLAlchemy(app)
+db = RideBoardSQLAlchemy(app)
 
-# OIDC Authentication, for CSH member login.
-auth = OIDCAuthentication(app, issuer=app.config["OIDC_ISSUER"],
-                          client_registration_info=app.config["OIDC_CLIENT_CONFIG"])
+# OIDC Authentication, for CSH member login. Discovery runs on the first login, not at import.
+auth = LazyOIDCAuthentication(app, issuer=app.config["OIDC_ISSUER"],
+                              client_registration_info=app.config["OIDC_CLIENT_CONFIG"])
 
 # pylint: disable=wrong-import-position
-from rideboard_api.models import Ride, Rider, Car, APIKey
-from .utils import user_auth
+from rideboard_api.models import Ride, Car
+from .cache import KeyCache, RenderedFile, ResponseCache, UpcomingCache
+from .events import LocalBroker, format_event
+from .keys import key_prefix, key_digest, matches
+from .metrics import Metrics
+from .ratelimit import RateLimiter, RateLimited, create_storage
+from .serializers import Serializer, parse_fields, project
+from .queries import ride_query, car_query, filter_rides, filter_cars, paginate, parse_limit, adjust_open_seats, \
+    user_cars, add_rider, remove_rider, remove_rides, remove_car, is_set, read_cache_version, \
+    commit_changes, key_digests
+
+# Cache of verified API keys, so check_key doesn't hit the database on every request.
+key_cache = KeyCache()
+
+# Per route request and SQL metrics, served on /metrics
+metrics = Metrics()
+
+# Per key rate limiting and usage counters
+limiter = RateLimiter(create_storage(app.config.get('RATE_LIMIT_STORAGE', 'memory')))
+
+# Rendered responses of the read routes, dropped by every write through the shared cache version
+response_cache = ResponseCache()
+
+# The next rides, for /upcoming
+upcoming_cache = UpcomingCache()
+
+# JSON encoder for every API response
+serializer = Serializer()
+
+# Pub/sub for the live change stream
+broker = LocalBroker()
+
+
+def configure_components():
+    """
+    Applies the cache, rate limit, JSON and event stream settings in app.config to the objects above.
+    They are imported by name in other modules, so they are updated in place rather than replaced.
+    """
+    key_cache.max_size = app.config.get('KEY_CACHE_SIZE', 1024)
+    key_cache.ttl = app.config.get('KEY_CACHE_TTL', 300)
+    key_cache.negative_max_size = app.config.get('KEY_CACHE_NEGATIVE_SIZE', 4096)
+    key_cache.negative_ttl = app.config.get('KEY_CACHE_NEGATIVE_TTL', 10)
+    limiter.rate = app.config.get('RATE_LIMIT_RATE', 0.0)
+    limiter.burst = app.config.get('RATE_LIMIT_BURST', 50)
+    response_cache.max_size = app.config.get('RESPONSE_CACHE_SIZE', 256)
+    response_cache.ttl = app.config.get('RESPONSE_CACHE_TTL', 30)
+    upcoming_cache.size = app.config.get('UPCOMING_CACHE_SIZE', 20)
+    upcoming_cache.ttl = app.config.get('UPCOMING_CACHE_TTL', 60)
+    upcoming_cache.invalidate()
+    serializer.configure(app.config.get('JSON_BACKEND', 'auto'), app.config.get('JSON_DATETIME_FORMAT', 'http'))
+    broker.max_queue_size = app.config.get('EVENT_STREAM_QUEUE_SIZE', 100)
+
+
+configure_components()
+
+# README rendered as the index page, re-rendered only when the file changes
+readme = RenderedFile(os.path.join(os.getcwd(), 'README.md'),
+                      lambda text: markdown.markdown(text, extensions=['markdown.extensions.tables',
+                                                                       'markdown.extensions.fenced_code']))
+
+
+@sa_event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # pylint: disable=unused-argument,too-many-arguments
+    if has_request_context():
+        g.sql_start = time.perf_counter()
+
+
+@sa_event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # pylint: disable=unused-argument,too-many-arguments
+    if has_request_context() and 'sql_start' in g:
+        elapsed = time.perf_counter() - g.sql_start
+        g.sql_time = g.get('sql_time', 0.0) + elapsed
+        g.setdefault('sql_statements', []).append((elapsed, statement))
+
+
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def _record_response(response):
+    _record_request(response.status_code)
+    return response
+
+
+@app.teardown_request
+def _record_failure(exc):
+    # Flask skips after_request when a view raises, so the 500 it answers with is counted here
+    if exc is not None:
+        _record_request(500)
+
+
+def _record_request(status: int):
+    if 'request_start' not in g or g.get('request_recorded'):
+        return
+    g.request_recorded = True
+    elapsed = time.perf_counter() - g.request_start
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    statements = g.get('sql_statements', [])
+    metrics.observe_request(route, request.method, status, elapsed, len(statements), g.get('sql_time', 0.0))
+    if elapsed > app.config.get('SLOW_REQUEST_THRESHOLD', 1.0):
+        app.logger.warning("Slow request %s %s took %.3fs, %d SQL statements:\n%s", request.method, route, elapsed,
+                           len(statements), '\n'.join('{:.4f}s {}'.format(*stmt) for stmt in statements))
+
+
+def cached_response(func):
+    """
+    Serves a read route from the response cache, with a strong ETag and 304s for matching If-None-Match headers.
+    The API key is still checked on every request.
+    """
+    @wraps(func)
+    def wrapped_function(*args, **kwargs):
+        if not check_key(kwargs['api_key']):
+            return "Invalid API Key!", 403
+        view_args = tuple(sorted((name, value) for name, value in request.view_args.items() if name != 'api_key'))
+        key = (request.endpoint, view_args, tuple(sorted(request.args.items(multi=True))))
+        version = cache_version()
+        cached = response_cache.get(key, version)
+        if cached is not None:
+            body, etag, headers = cached
+            response = app.response_class(body, mimetype='application/json', headers=headers)
+        else:
+            response = make_response(func(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            headers = {}
+            if 'X-Next-Cursor' in response.headers:
+                headers['X-Next-Cursor'] = response.headers['X-Next-Cursor']
+            etag = response_cache.set(key, response.get_data(), headers, version)
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+    return wrapped_function
+
+
+def cache_version() -> int:
+    """
+    Returns the cache version shared by every worker, read once per request.
+    Cached data is only served while the version it was built at is current.
+    Within DATABASE_REPLICA_LAG seconds of the last write the request reads from the primary,
+    so neither the response nor the cache entry built from it can miss that write.
+    """
+    if 'cache_version' not in g:
+        g.cache_version, changed_at, g.key_version = read_cache_version()
+        g.read_primary = time.time() - changed_at < app.config.get('DATABASE_REPLICA_LAG', 5)
+    return g.cache_version
+
+
+def key_version() -> int:
+    """
+    Returns the key version shared by every worker, read with the cache version once per request.
+    Cached key verifications are only served while the version they were checked at is current.
+    """
+    cache_version()
+    return g.key_version
+
+
+@app.before_request
+def _check_replica_lag():
+    if request.endpoint in READ_ENDPOINTS and app.config.get('DATABASE_READ_REPLICA_URI'):
+        cache_version()
+
+
+def data_changed(event_type: str, data: dict):
+    """
+    Called after every write committed with commit_changes, clears this worker's caches built from ride data
+    and notifies stream clients.
+    :param event_type: name of the change, e.g. rider_joined
+    :param data: JSON serializable description of the change
+    """
+    g.pop('cache_version', None)
+    response_cache.invalidate()
+    upcoming_cache.invalidate()
+    broker.publish(event_type, serializer.dumps(data).decode('utf-8'))
 
 
 @app.route('/', methods=['GET'])
 @app.template_filter("markdown")
 def index():
-    f = open('README.md', 'r')
-    return markdown.markdown(f.read(), extensions=['markdown.extensions.tables', 'markdown.extensions.fenced_code'])
+    body, etag, last_modified = readme.get()
+    response = make_response(body)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response.make_conditional(request)
+
+
+@app.route('/healthz', methods=['GET'])
+def health_check():
+    """
+    Checks that the database, and the read replica if there is one, answer through the connection pool.
+    Doesn't need an API key, for load balancer and orchestrator probes.
+    :return: JSON with the pool status, 200 if healthy or 503 if not
+    """
+    engines = {'primary': db.engine}
+    replica = db.get_replica_engine(app)
+    if replica is not None:
+        engines['replica'] = replica
+    status = {}
+    healthy = True
+    for name, engine in engines.items():
+        try:
+            with engine.connect() as conn:
+                conn.execute('SELECT 1')
+            status[name] = {'ok': True, 'pool': engine.pool.status()}
+        except SQLAlchemyError as e:
+            healthy = False
+            status[name] = {'ok': False, 'error': e.__class__.__name__}
+    response = json_response(status)
+    response.status_code = 200 if healthy else 503
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_page():
+    """
+    Returns request, SQL and cache metrics of this worker in the Prometheus text format
+    """
+    key_stats = key_cache.stats()
+    response_stats = response_cache.stats()
+    gauges = {
+        'key_cache_hits_total': ("API key verifications answered by the key cache.", 'counter', key_stats['hits']),
+        'key_cache_misses_total': ("API key verifications that queried the database.", 'counter',
+                                   key_stats['misses']),
+        'response_cache_hits_total': ("Read requests answered by the response cache.", 'counter',
+                                      response_stats['hits']),
+        'response_cache_misses_total': ("Read requests that had to be rendered.", 'counter',
+                                        response_stats['misses']),
+        'stream_clients': ("Connected /stream clients.", 'gauge', broker.subscribers())
+    }
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/<api_key>/all', methods=['GET'])
-@cross_origin(headers=['Content-Type'])
+@cross_origin(headers=['Content-Type'], expose_headers=['X-Next-Cursor'])
+@cached_response
 def all_events(api_key: str):
     """
-    Returns all Events in the database
+    Returns all Events in the database, optionally filtered and paginated
     :param api_key: API key allowing for the use of the API
     :return: Returns JSON of all events in the rideboard database
     """
     if check_key(api_key):
         rideid = request.args.get('id')
+        fields = parse_fields(request.args.get('fields'))
+        # Only load cars and riders if they are returned
+        rides = ride_query() if fields is None or 'cars' in fields else Ride.query
         query = []
+        next_cursor = None
         if rideid is not None:
             # adds a Ride object to the List:query
-            query.append(Ride.query.get(rideid))
+            query.append(rides.get(rideid))
         else:
-            # Makes query a List of all rides
-            query = Ride.query.all()
-        return parse_events_as_json(query)
+            # Makes query a List of all matching rides
+            try:
+                query, next_cursor = paginate(filter_rides(rides, request.args),
+                                              Ride.start_time, Ride.id, request.args)
+            except ValueError as e:
+                return str(e), 400
+        response = parse_events_as_json(query, fields=fields)
+        if next_cursor is not None:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
     return "Invalid API Key!", 403
 
 @app.route('/<api_key>/get/car', methods=['GET'])
-@cross_origin(headers=['Content-Type'])
+@cross_origin(headers=['Content-Type'], expose_headers=['X-Next-Cursor'])
+@cached_response
 def all_cars(api_key: str):
     """
-    Returns all Cars in the database
+    Returns all Cars in the database, optionally filtered and paginated
     :param api_key: API key allowing for the use of the API
     :return: Returns JSON of all cars in the rideboard database
     """
     if check_key(api_key):
         carid = request.args.get('id')
+        fields = parse_fields(request.args.get('fields'))
+        # Only load riders if they are returned
+        cars = car_query() if fields is None or 'riders' in fields else Car.query
         query = []
+        next_cursor = None
         if carid is not None:
             # adds a Car object to the List:query
-            query.append(Car.query.get(carid))
+            query.append(cars.get(carid))
         else:
-            # Makes query a List of all cars
-            query = Car.query.all()
-        return parse_cars_as_json(query)
+            # Makes query a List of all matching cars
+            try:
+                query, next_cursor = paginate(filter_cars(cars, request.args),
+                                              Car.departure_time, Car.id, request.args)
+            except ValueError as e:
+                return str(e), 400
+        response = parse_cars_as_json(query, fields=fields)
+        if next_cursor is not None:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
     return "Invalid API Key!", 403
 
 
@@ -86,13 +340,95 @@ def all_cars(api_key: str):
 @cross_origin(headers=['Content-Type'])
 def upcoming_event(api_key: str):
     """
-    Returns the Event with the earliest start_time as JSON
+    Returns the next Event to start as JSON, or a list of the next limit Events.
+    Served from the upcoming cache alone, not the response cache, so an Event drops out as soon as it starts.
     :param api_key: API key allowing for the use of the API
     :return: JSON of the upcoming event
     """
     if check_key(api_key):
-        query = Ride.query.order_by(Ride.start_time.asc()).first()
-        return jsonify(return_event_json(query))
+        fields = parse_fields(request.args.get('fields'))
+        limit = request.args.get('limit')
+        try:
+            rides = upcoming_rides(1 if limit is None else parse_limit(limit))
+        except ValueError as e:
+            return str(e), 400
+        rides = [project(ride, fields) for ride in rides]
+        if limit is not None:
+            response = json_response(rides)
+        elif rides:
+            response = json_response(rides[0])
+        else:
+            return "There are no upcoming events!", 404
+        response.add_etag()
+        return response.make_conditional(request)
+    return "Invalid API Key!", 403
+
+
+def upcoming_rides(limit: int) -> list:
+    """
+    Returns the next rides to start, from the upcoming cache when it can answer
+    :param limit: number of rides
+    :return: list of rides as JSON
+    """
+    now = datetime.now()
+    version = cache_version()
+    rides = upcoming_cache.get(limit, now, version)
+    if rides is None:
+        count = max(limit, upcoming_cache.size)
+        query = ride_query().filter(Ride.start_time >= now).order_by(Ride.start_time.asc(), Ride.id.asc())
+        rides = [(ride.start_time, return_event_json(ride)) for ride in query.limit(count).all()]
+        upcoming_cache.set(rides, len(rides) < count, version)
+        rides = [ride for _, ride in rides[:limit]]
+    return rides
+
+
+@app.route('/<api_key>/user/<username>', methods=['GET'])
+@cross_origin(headers=['Content-Type'])
+@cached_response
+def user_rides(api_key: str, username: str):
+    """
+    Returns the cars a user drives or rides in
+    :param api_key: API key allowing for the use of the API
+    :param username: username
+    :return: JSON list of the user's cars, with the event id and the user's role
+    """
+    if check_key(api_key):
+        ride_id = request.args.get('ride_id')
+        if ride_id is not None and not ride_id.isdigit():
+            return "ride_id must be a number!", 400
+        cars = user_cars(username, ride_id)
+        return json_response([{'ride_id': ride, 'car_id': car, 'role': role} for ride, car, role in cars])
+    return "Invalid API Key!", 403
+
+
+@app.route('/<api_key>/stream', methods=['GET'])
+@cross_origin(headers=['Content-Type'])
+def stream_events(api_key: str):
+    """
+    Streams changes to the ride board as server-sent events
+    :param api_key: API key allowing for the use of the API
+    :return: text/event-stream response that stays open until the client disconnects
+    """
+    if check_key(api_key):
+        heartbeat = app.config.get('EVENT_STREAM_HEARTBEAT', 15)
+        subscription = broker.subscribe()
+
+        def generate():
+            try:
+                yield 'retry: 5000\n\n'
+                while not subscription.closed:
+                    try:
+                        event = subscription.queue.get(timeout=heartbeat)
+                    except queue.Empty:
+                        # Comment line, keeps proxies from closing an idle connection
+                        yield ': keep-alive\n\n'
+                        continue
+                    yield format_event(*event)
+            finally:
+                broker.unsubscribe(subscription)
+
+        return Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
     return "Invalid API Key!", 403
 
 
@@ -110,23 +446,20 @@ def join_car(car_id, username: str, first_name: str, last_name: str, api_key: st
     """
     # TODO: Don't use the car_id, use event_id and car owner's uid
     if check_key(api_key):
-        incar = False
         name = first_name+" "+last_name
         car = Car.query.filter(Car.id == car_id).first()
-        event = Ride.query.filter(Ride.id == car.ride_id).first()
-        for c in event.cars:
-            if c.username == username:
-                incar = True
-            for person in c.riders:
-                if person.username == username:
-                    incar = True
-        if (car.current_capacity < car.max_capacity or car.max_capacity == 0) and not incar:
-            rider = Rider(username, name, car_id)
-            car.current_capacity += 1
-            db.session.add(rider)
-            db.session.add(car)
-            db.session.commit()
-            return jsonify(return_event_json(event))
+        if car is None:
+            return "That car doesn't exist, check your car_id...", 400
+        ride_id = car.ride_id
+        if add_rider(car, username, name):
+            try:
+                commit_changes()
+            except IntegrityError:
+                db.session.rollback()
+            else:
+                data_changed('rider_joined', {'ride_id': ride_id, 'car_id': int(car_id), 'username': username})
+                return json_response(return_event_json(ride_query().get(ride_id)))
+        db.session.rollback()
         return "The car is either full, or you have already joined a ride, or you are the owner of one!", 400
     return "Invalid API Key!", 403
 
@@ -142,19 +475,86 @@ def leave_ride(event_id, username: str, api_key: str):
     :return: Event as JSON in which the Car belongs to.
     """
     if check_key(api_key):
-        event = Ride.query.filter(Ride.id == event_id).first()
-        for car in event.cars:
-            rider = Rider.query.filter(Rider.username == username, Rider.car_id == car.id).first()
-            if rider is not None:
-                db.session.delete(rider)
-                car.current_capacity -= 1
-                db.session.add(car)
-                db.session.commit()
-                return jsonify(return_event_json(event))
+        car_id = remove_rider(event_id, username)
+        if car_id is not None:
+            commit_changes()
+            data_changed('rider_left', {'ride_id': int(event_id), 'car_id': car_id, 'username': username})
+            return json_response(return_event_json(ride_query().get(event_id)))
+        db.session.rollback()
         return "You are not a rider in that event!", 400
     return "Invalid API Key!", 403
 
 
+@app.route('/<api_key>/batch', methods=['POST'])
+@cross_origin(headers=['Content-Type'])
+def batch_riders(api_key: str):
+    """
+    Applies a JSON list of join and leave operations in a single transaction, in order.
+    Each operation is {"action": "join", "car_id", "username", "first_name", "last_name"}
+    or {"action": "leave", "event_id", "username"}.
+    :param api_key: API key allowing for the use of the API
+    :return: the changed Events as JSON, or 400 and nothing applied if any operation fails
+    """
+    if check_key(api_key):
+        operations = request.get_json()
+        if not isinstance(operations, list):
+            return "Expected a JSON list of operations!", 400
+        changes = []
+        try:
+            for position, operation in enumerate(operations):
+                changes.append(apply_operation(operation))
+            commit_changes()
+        except ValueError as e:
+            db.session.rollback()
+            return "Operation {}: {}".format(position, e), 400
+        except IntegrityError:
+            db.session.rollback()
+            return "A user can only be in one car per event!", 400
+        for event_type, change in changes:
+            data_changed(event_type, change)
+        ride_ids = sorted({change['ride_id'] for _, change in changes})
+        if not ride_ids:
+            return json_response([])
+        return parse_events_as_json(ride_query().filter(Ride.id.in_(ride_ids)).order_by(Ride.id).all())
+    return "Invalid API Key!", 403
+
+
+def apply_operation(operation: dict):
+    """
+    Applies one operation of /batch as part of the current transaction
+    :param operation: join or leave operation
+    :return: tuple of (event type, change) to publish once the transaction commits
+    """
+    if not isinstance(operation, dict):
+        raise ValueError("expected a JSON object")
+    action = operation.get('action')
+    username = operation.get('username')
+    if not username:
+        raise ValueError("username not provided!")
+    if action == 'join':
+        try:
+            car_id = int(operation['car_id'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("car_id not provided!")
+        car = Car.query.filter(Car.id == car_id).first()
+        if car is None:
+            raise ValueError("That car doesn't exist, check your car_id...")
+        name = "{} {}".format(operation.get('first_name', ''), operation.get('last_name', '')).strip()
+        if not add_rider(car, username, name):
+            raise ValueError("The car is either full, or you have already joined a ride, or you are the owner of one!")
+        return 'rider_joined', {'ride_id': car.ride_id, 'car_id': car.id, 'username': username}
+    if action == 'leave':
+        try:
+            ride_id = int(operation['event_id'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("event_id not provided!")
+        car_id = remove_rider(ride_id, username)
+        if car_id is None:
+            raise ValueError("You are not a rider in that event!")
+        return 'rider_left', {'ride_id': ride_id, 'car_id': car_id, 'username': username}
+    raise ValueError("action must be join or leave!")
+
+
 # TODO: The ifs execute in order. if multiple things were not provided then it would only show the error on the first.
 @app.route('/<api_key>/create/event', methods=['POST'])
 @cross_origin(headers=['Content-Type'])
@@ -191,11 +591,14 @@ def create_event(api_key: str):
         end_time = datetime.strptime(end_time, time_format)
         ride = Ride(name, address, start_time, end_time, creator)
         db.session.add(ride)
-        db.session.commit()
+        # Flushing assigns ride.id (with RETURNING on PostgreSQL), so the event and its car commit together
+        db.session.flush()
         infinity = Car('∞', 'Need a Ride', 0, 0, start_time, end_time, "", ride.id)
         db.session.add(infinity)
-        db.session.commit()
-        return jsonify(return_event_json(ride))
+        commit_changes()
+        event_json = return_event_json(ride)
+        data_changed('ride_created', event_json)
+        return json_response(event_json)
     return "Invalid API Key!", 403
 
 
@@ -227,7 +630,10 @@ def create_car(api_key: str, event_id):
         else:
             return "Car's return_time not provided!", 400
         if 'max_capacity' in data:
-            max_capacity = data['max_capacity']
+            try:
+                max_capacity = int(data['max_capacity'])
+            except (TypeError, ValueError):
+                return "Car max_capacity must be a number!", 400
         else:
             return "Car max_capacity not provided!", 400
         if 'driver_comment' in data:
@@ -239,8 +645,10 @@ def create_car(api_key: str, event_id):
         return_time = datetime.strptime(return_time, time_format)
         car = Car(username, name, 0, max_capacity, departure_time, return_time, driver_comment, event_id)
         db.session.add(car)
-        db.session.commit()
-        return jsonify(return_event_json(Ride.query.filter(Ride.id == event_id).first()))
+        adjust_open_seats(event_id, max(max_capacity, 0))
+        commit_changes()
+        data_changed('car_added', return_car_dict(car))
+        return json_response(return_event_json(Ride.query.filter(Ride.id == event_id).first()))
     return "Invalid API Key!", 403
 
 
@@ -248,7 +656,7 @@ def create_car(api_key: str, event_id):
 @cross_origin(headers=['Content-Type'])
 def delete_event(api_key: str, event_id, uid):
     """
-    Delete an event.
+    Delete an event, or move it to the history tables if the archive parameter is true.
     :param api_key: API key allowing for the use of the API
     :param event_id: ID of the event to delete.
     :param uid: username of the person requesting this.
@@ -258,12 +666,9 @@ def delete_event(api_key: str, event_id, uid):
         event = Ride.query.filter(Ride.id == event_id).first()
         if event is not None:
             if event.creator == uid:
-                for car in event.cars:
-                    for peeps in car.riders:
-                        db.session.delete(peeps)
-                    db.session.delete(car)
-                db.session.delete(event)
-                db.session.commit()
+                remove_rides(Ride.id == event.id, archive=is_set(request.args, 'archive'))
+                commit_changes()
+                data_changed('ride_deleted', {'ride_id': int(event_id)})
                 return "Deletion Successful", 200
             return "You didn't create that event...", 403
         return "That event doesn't exist, check your event_id...", 400
@@ -284,149 +689,99 @@ def delete_car(api_key: str, event_id, uid):
         car = Car.query.filter(Car.username == uid, Car.ride_id == event_id).first()
         if car is not None:
             if car.username == uid:
-                for peeps in car.riders:
-                    db.session.delete(peeps)
-                db.session.delete(car)
-                db.session.commit()
+                if car.max_capacity > 0:
+                    adjust_open_seats(car.ride_id, car.current_capacity - car.max_capacity)
+                car_id = car.id
+                remove_car(car_id)
+                commit_changes()
+                data_changed('car_deleted', {'ride_id': int(event_id), 'car_id': car_id})
                 return "Deletion Successful", 200
             return "You don't own that car.", 403
         return "You do not have a car in that event!", 400
     return "Invalid API Key!", 403
 
 
-@app.route('/generatekey/<reason>', methods=['GET'])
-@auth.oidc_auth
-@user_auth
-def generate_api_key(reason: str, metadata=None):
-    """
-    Creates an API key for the user requested.
-    Using a reason and the username grabbed through the @auth.oidc_auth call
-    :param reason: Reason for the API key
-    :param metadata: auth dictionary
-    :return: Hash of the Key or a String stating an error
-    """
-    if not check_key_unique(metadata['uid'], reason):
-        if metadata['is_rtp'] or metadata['uid'] == 'agoel':
-            # Creates the new API key
-            new_key = APIKey(metadata['uid'], reason)
-            # Adds, flushes and commits the new object to the database
-            db.session.add(new_key)
-            db.session.flush()
-            db.session.commit()
-            return new_key.hash
-        return "You are not authorized to see this.", 403
-    return "There's already a key with this reason for this user!", 400
-
-
-@app.route('/listapikeys', methods=['GET'])
-@auth.oidc_auth
-@user_auth
-@cross_origin(headers=['Content-Type'])
-def list_api_keys(metadata=None):
-    if metadata['is_rtp'] or metadata['uid'] == 'agoel':
-        return parse_apikeys_as_json(APIKey.query.all())
-    return "You are not authorized to see this.", 403
-
-
 def check_key(api_key: str) -> bool:
     """
-    Checks if the key exists using the hash
+    Checks if the key exists by its digest, consulting the key cache first while the shared key version is unchanged.
+    On a miss the keys sharing its prefix are loaded from the primary database through the prefix index
+    and their digests compared in constant time.
+    Valid keys are counted against their rate limit once per request.
     :param api_key: API key
     :return: true if the key exists in the database
     """
-    keys = APIKey.query.filter_by(hash=api_key).all()
-    if keys:
+    if g.get('checked_key') == api_key:
         return True
-    return False
+    digest = key_digest(api_key)
+    version = key_version()
+    valid = key_cache.get(digest, version)
+    if valid is None:
+        valid = matches(digest, key_digests(key_prefix(api_key)))
+        key_cache.set(digest, valid, version)
+    if valid:
+        limiter.hit(digest)
+        g.checked_key = api_key
+    return valid
 
 
-def check_key_unique(owner: str, reason: str) -> bool:
-    """
-    Checks if the key exists using the owner and the reason
-    :param owner: generator of the key
-    :param reason: reason provided for the key
-    :return: true if the key exists uniquely
-    """
-    keys = APIKey.query.filter_by(owner=owner, reason=reason).all()
-    if keys:
-        return True
-    return False
-
-
-def return_apikey_json(key: APIKey):
-    """
-    Returns an APIKey Object as JSON
-    :param key: The APIKey object being formatted
-    :return: Returns the APIKey object formatted to return as JSON
-    """
-    return {
-        'id': key.id,
-        'owner': key.owner,
-        'hash': key.hash,
-        'reason': key.reason
-    }
+@app.errorhandler(RateLimited)
+def rate_limited(error):
+    return "Rate limit exceeded, try again later!", 429, {'Retry-After': str(error.retry_after)}
 
 
-def parse_apikeys_as_json(keys: list, key_json=None) -> list:
+def json_response(data):
     """
-    Builds a list of APIKey as JSON
-    :param keys: List of APIKey Objects
-    :param key_json: List of APIKey Objects as dicts
-    :return: Returns a list of APIKey Objects as dicts
+    Builds a JSON response with the configured serializer
+    :param data: JSON serializable data
+    :return: application/json response
     """
-    if key_json is None:
-        key_json = []
-    for key in keys:
-        key_json.append(return_apikey_json(key))
-    return jsonify(key_json)
+    return app.response_class(serializer.dumps(data), mimetype='application/json')
 
 
-def return_event_json(event: Ride):
+def return_event_json(event: Ride, fields=None):
     """
     Returns an Event Object as JSON
     :param event: The event object being formatted
+    :param fields: set of fields to return, None for all of them
     :return: Returns the event object formatted to return as JSON
     """
-    open_seats = 0
-    if event.cars is not None:
-        for car in event.cars:
-            open_seats += car.max_capacity - car.current_capacity
-    return {
+    event_json = {
         'id': event.id,
         'name': event.name,
         'address': event.address,
         'start_time': event.start_time,
         'end_time': event.end_time,
         'creator': event.creator,
-        'open_seats': open_seats,
-        'cars': parse_cars_as_dict(event.cars)
+        'open_seats': event.open_seats
     }
+    if fields is None or 'cars' in fields:
+        event_json['cars'] = parse_cars_as_dict(event.cars)
+    return project(event_json, fields)
 
 
-def parse_events_as_json(events: list, event_json=None) -> list:
+def parse_events_as_json(events: list, event_json=None, fields=None) -> list:
     """
     Builds a list of Events as JSON
     :param events: List of Event Objects
     :param event_json: List of Event Objects as dicts
+    :param fields: set of fields to return, None for all of them
     :return: Returns a list of Event Objects as dicts
     """
     if event_json is None:
         event_json = []
     for event in events:
-        event_json.append(return_event_json(event))
-    return jsonify(event_json)
+        event_json.append(return_event_json(event, fields))
+    return json_response(event_json)
 
 
-def return_car_dict(car: Car):
+def return_car_dict(car: Car, fields=None):
     """
     Returns a Car Object as dictionary
     :param car: The car object being formatted
+    :param fields: set of fields to return, None for all of them
     :return: Returns the car object formatted to return as dictionary
     """
-    riders = []
-    for rider in car.riders:
-        riders.append(rider.username)
-    return {
+    car_dict = {
         'id': car.id,
         'name': car.name,
         'username': car.username,
@@ -435,9 +790,11 @@ def return_car_dict(car: Car):
         'departure_time': car.departure_time,
         'return_time': car.return_time,
         'driver_comment': car.driver_comment,
-        'ride_id': car.ride_id,
-        'riders': riders,
+        'ride_id': car.ride_id
     }
+    if fields is None or 'riders' in fields:
+        car_dict['riders'] = [rider.username for rider in car.riders]
+    return project(car_dict, fields)
 
 
 def parse_cars_as_dict(cars: list, car_dict=None) -> list:
@@ -454,21 +811,49 @@ def parse_cars_as_dict(cars: list, car_dict=None) -> list:
     return car_dict
 
 
-def parse_cars_as_json(cars: list, car_json=None) -> list:
+def parse_cars_as_json(cars: list, car_json=None, fields=None) -> list:
     """
     Builds a list of Cars as JSON
     :param cars: List of Car Objects
     :param car_json: List of Car Objects as dicts
+    :param fields: set of fields to return, None for all of them
     :return: Returns a list of Car Objects as dicts
     """
     if car_json is None:
         car_json = []
     for car in cars:
-        car_json.append(return_car_dict(car))
-    return jsonify(car_json)
+        car_json.append(return_car_dict(car, fields))
+    return json_response(car_json)
+
+
+def create_app(**config):
+    """
+    Entry point for WSGI servers, e.g. gunicorn 'rideboard_api:create_app()'.
+    The routes live on the module level app, so this configures and returns that app.
+    :param config: settings overriding the config file
+    :return: the Flask app
+    """
+    app.config.update(config)
+    if 'RATE_LIMIT_STORAGE' in config:
+        limiter.storage = create_storage(config['RATE_LIMIT_STORAGE'])
+    configure_components()
+    return app
+
+
+@app.before_first_request
+def _start_jobs():
+    """
+    Starts this worker's cache warming thread, if CACHE_WARM_INTERVAL is set
+    """
+    from .jobs import cache_jobs
+    cache_jobs(app).start()
 
 
 @app.route("/logout")
 @auth.oidc_logout
 def _logout():
     return redirect("/", 302)
+
+
+# Registers the routes and flask commands kept in their own modules
+from . import cli, key_routes, transfer_routes  # pylint: disable=unused-import
@@ -0,0 +1,283 @@
+####################################
+# File name: analytics.py          #
+# Author: Ayush Goel               #
+####################################
+import csv
+import io
+import os
+from rideboard_api import db
+from rideboard_api.models import Ride, Car, Rider, RideHistory, CarHistory, RiderHistory
+from rideboard_api.serializers import iso_date
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Rows fetched from the cursor, and rows written per CSV chunk or Arrow record batch
+BATCH_SIZE = 1000
+
+# Columns of every exported table as (name, type), in export order
+COLUMNS = {
+    'rides': (('id', 'int'), ('name', 'str'), ('address', 'str'), ('start_time', 'time'), ('end_time', 'time'),
+              ('creator', 'str'), ('open_seats', 'int')),
+    'cars': (('id', 'int'), ('ride_id', 'int'), ('username', 'str'), ('name', 'str'), ('current_capacity', 'int'),
+             ('max_capacity', 'int'), ('departure_time', 'time'), ('return_time', 'time'),
+             ('driver_comment', 'str')),
+    'riders': (('id', 'int'), ('ride_id', 'int'), ('car_id', 'int'), ('username', 'str'), ('name', 'str')),
+    'seats': (('ride_id', 'int'), ('cars', 'int'), ('seats_offered', 'int'), ('seats_filled', 'int'),
+              ('riders_without_seat', 'int')),
+}
+MODELS = {'rides': Ride, 'cars': Car, 'riders': Rider}
+HISTORY_MODELS = {'rides': RideHistory, 'cars': CarHistory, 'riders': RiderHistory}
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def table_rows(table: str, history=False):
+    """
+    Streams the rows of a table as tuples, on a server-side cursor where the driver supports one,
+    without building ORM objects. Cars come ordered by ride, so seat totals can be summed as they pass.
+    :param table: rides, cars or riders
+    :param history: read the archived rows from the history tables instead
+    :return: generator of rows with the columns of COLUMNS[table]
+    """
+    model = (HISTORY_MODELS if history else MODELS)[table]
+    order = (model.ride_id, model.id) if table == 'cars' else (model.id,)
+    query = db.session.query(*[getattr(model, name) for name, _ in COLUMNS[table]]).order_by(*order)
+    return query.yield_per(BATCH_SIZE)
+
+
+class SeatTotals:
+    """
+    Sums the seats offered and filled per ride from cars ordered by ride, holding one ride at a time.
+    Like open_seats, the Need a Ride car doesn't offer seats; its riders are counted as riders_without_seat.
+    """
+
+    def __init__(self):
+        self.current = None
+
+    def add(self, car) -> list:
+        """
+        Counts a car
+        :param car: row of the cars table
+        :return: totals of the previous ride once the car belongs to the next one, else an empty list
+        """
+        finished = []
+        if self.current is not None and self.current[0] != car.ride_id:
+            finished = self.close()
+        if self.current is None:
+            self.current = [car.ride_id, 0, 0, 0, 0]
+        if car.max_capacity > 0:
+            self.current[1] += 1
+            self.current[2] += car.max_capacity
+            self.current[3] += car.current_capacity
+        else:
+            self.current[4] += car.current_capacity
+        return finished
+
+    def close(self) -> list:
+        """
+        :return: totals of the last ride, if any
+        """
+        finished = [tuple(self.current)] if self.current is not None else []
+        self.current = None
+        return finished
+
+
+class CSVWriter:
+    """
+    Encodes rows as CSV with a header, in chunks of BATCH_SIZE rows. Times are ISO-8601.
+    """
+
+    def __init__(self, columns):
+        self.types = [kind for _, kind in columns]
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.writer.writerow([name for name, _ in columns])
+        self.pending = 0
+
+    def write(self, row) -> bytes:
+        """
+        :param row: tuple of values
+        :return: the next chunk once BATCH_SIZE rows are buffered, else b''
+        """
+        self.writer.writerow([csv_value(value, kind) for value, kind in zip(row, self.types)])
+        self.pending += 1
+        if self.pending >= BATCH_SIZE:
+            return self.drain()
+        return b''
+
+    def close(self) -> bytes:
+        return self.drain()
+
+    def drain(self) -> bytes:
+        data = self.buffer.getvalue().encode('utf-8')
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.pending = 0
+        return data
+
+
+def csv_value(value, kind: str):
+    if value is None:
+        return ''
+    if kind == 'time':
+        return iso_date(value)
+    return value
+
+
+class ChunkSink(io.RawIOBase):
+    """
+    Write-only file that hands out what was written since the last drain, so pyarrow writers can be streamed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ArrowWriter:
+    """
+    Encodes rows as an Arrow IPC stream or a Parquet file, one record batch (row group) per BATCH_SIZE rows.
+    """
+
+    def __init__(self, columns, parquet=False):
+        types = {'int': pyarrow.int64(), 'str': pyarrow.string(), 'time': pyarrow.timestamp('us')}
+        self.schema = pyarrow.schema([(name, types[kind]) for name, kind in columns])
+        self.sink = ChunkSink()
+        if parquet:
+            self.writer = pyarrow.parquet.ParquetWriter(self.sink, self.schema)
+        else:
+            self.writer = pyarrow.ipc.new_stream(self.sink, self.schema)
+        self.rows = []
+
+    def write(self, row) -> bytes:
+        self.rows.append(row)
+        if len(self.rows) >= BATCH_SIZE:
+            self.flush()
+        return self.sink.drain()
+
+    def close(self) -> bytes:
+        self.flush()
+        self.writer.close()
+        return self.sink.drain()
+
+    def flush(self):
+        if not self.rows:
+            return
+        arrays = [pyarrow.array(list(values), type=field.type) for values, field in zip(zip(*self.rows), self.schema)]
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+        self.rows = []
+
+
+def create_writer(export_format: str, columns):
+    """
+    :param export_format: csv, arrow or parquet
+    :param columns: columns of the table, from COLUMNS
+    :return: writer for the format
+    :raises ValueError: if the format is unknown or needs pyarrow and it isn't installed
+    """
+    if export_format == 'csv':
+        return CSVWriter(columns)
+    if export_format in ('arrow', 'parquet'):
+        if pyarrow is None:
+            raise ValueError("The {} format needs pyarrow installed!".format(export_format))
+        return ArrowWriter(columns, parquet=export_format == 'parquet')
+    raise ValueError("format must be one of csv, arrow or parquet!")
+
+
+def export_table(table: str, export_format='csv', history=False):
+    """
+    Encodes a table straight from the database cursor, so memory stays flat no matter how big it is.
+    :param table: rides, cars, riders, or seats for the seats offered and filled per event
+    :param export_format: csv, arrow or parquet
+    :param history: export the archived rides from the history tables instead
+    :return: generator of encoded chunks
+    :raises ValueError: if the table or format is unknown
+    """
+    if table not in COLUMNS:
+        raise ValueError("table must be one of {}!".format(', '.join(sorted(COLUMNS))))
+    writer = create_writer(export_format, COLUMNS[table])
+    return _encode(writer, table, history)
+
+
+def _encode(writer, table: str, history: bool):
+    for row in seat_rows(history) if table == 'seats' else table_rows(table, history):
+        chunk = writer.write(row)
+        if chunk:
+            yield chunk
+    yield writer.close()
+
+
+def seat_rows(history=False):
+    """
+    Yields the seats offered and filled per event from a single pass over the cars
+    :param history: read the archived cars instead
+    :return: generator of rows with the columns of COLUMNS['seats']
+    """
+    totals = SeatTotals()
+    for car in table_rows('cars', history):
+        yield from totals.add(car)
+    yield from totals.close()
+
+
+def export_tables(directory: str, export_format='csv', history=False) -> dict:
+    """
+    Writes every table to a file in directory, computing the seat totals in the same pass as the cars.
+    :param directory: directory to write rides, cars, riders and seats files to
+    :param export_format: csv, arrow or parquet
+    :param history: export the archived rides from the history tables instead
+    :return: number of rows written per table
+    """
+    tables = ('rides', 'cars', 'riders', 'seats')
+    writers = {table: create_writer(export_format, COLUMNS[table]) for table in tables}
+    counts = {table: 0 for table in tables}
+    files = {}
+    os.makedirs(directory, exist_ok=True)
+    try:
+        for table in tables:
+            files[table] = open(os.path.join(directory, '{}.{}'.format(table, export_format)), 'wb')
+        for table in ('rides', 'riders'):
+            for row in table_rows(table, history):
+                files[table].write(writers[table].write(row))
+                counts[table] += 1
+        totals = SeatTotals()
+        for car in table_rows('cars', history):
+            files['cars'].write(writers['cars'].write(car))
+            counts['cars'] += 1
+            for row in totals.add(car):
+                files['seats'].write(writers['seats'].write(row))
+                counts['seats'] += 1
+        for row in totals.close():
+            files['seats'].write(writers['seats'].write(row))
+            counts['seats'] += 1
+        for table, writer in writers.items():
+            files[table].write(writer.close())
+    finally:
+        for f in files.values():
+            f.close()
+    return counts
@@ -0,0 +1,316 @@
+####################################
+# File name: asgi.py               #
+# Author: Ayush Goel               #
+####################################
+import asyncio
+import hashlib
+import re
+import time
+from datetime import datetime
+from urllib.parse import parse_qsl
+
+from rideboard_api import app, broker, key_cache, limiter, metrics, response_cache, serializer
+from rideboard_api.events import format_event
+from rideboard_api.keys import key_prefix, key_digest, matches
+from rideboard_api.ratelimit import RateLimited
+from rideboard_api.serializers import parse_fields, project
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+    WsgiToAsgi = None
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+RIDE_COLUMNS = 'id, name, address, start_time, end_time, creator, open_seats'
+CAR_COLUMNS = 'id, name, username, current_capacity, max_capacity, departure_time, return_time, driver_comment, ride_id'
+
+# Read routes served natively, with the endpoint name the response cache knows them by
+ROUTES = (
+    (re.compile(r'^/(?P<api_key>[^/]+)/all$'), 'all_events'),
+    (re.compile(r'^/(?P<api_key>[^/]+)/get/car$'), 'all_cars'),
+    (re.compile(r'^/(?P<api_key>[^/]+)/upcoming$'), 'upcoming_event'),
+    (re.compile(r'^/(?P<api_key>[^/]+)/stream$'), 'stream_events'),
+)
+# Query parameters the native routes understand, anything else is left to Flask
+NATIVE_ARGS = {'id', 'fields'}
+
+
+def asyncpg_dsn(uri: str):
+    """
+    Turns an SQLAlchemy PostgreSQL URI into an asyncpg DSN
+    :param uri: SQLALCHEMY_DATABASE_URI
+    :return: DSN, or None if the database isn't PostgreSQL
+    """
+    if not uri:
+        return None
+    scheme, _, rest = uri.partition('://')
+    if scheme.split('+')[0] not in ('postgres', 'postgresql'):
+        return None
+    return 'postgresql://' + rest
+
+
+class RideBoardASGI:
+    """
+    ASGI application serving the read routes and the event stream on asyncio with an asyncpg pool.
+    Every other route, and any request the native routes don't handle, goes to the Flask app on a thread pool.
+    """
+
+    def __init__(self, flask_app):
+        if WsgiToAsgi is None:
+            raise ImportError("The ASGI server needs asgiref installed: pip install asgiref asyncpg uvicorn")
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.dsn = asyncpg_dsn(flask_app.config.get('SQLALCHEMY_DATABASE_URI')) if asyncpg is not None else None
+        self.pool = None
+        self._pool_lock = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] == 'http' and scope['method'] == 'GET' and self.dsn is not None:
+            for pattern, endpoint in ROUTES:
+                match = pattern.match(scope['path'])
+                if match is None:
+                    continue
+                args = parse_qsl(scope['query_string'].decode('latin-1'))
+                if endpoint == 'stream_events':
+                    await self.guarded(self.stream, scope, receive, send, match.group('api_key'))
+                    return
+                if all(name in NATIVE_ARGS for name, _ in args) and dict(args).get('id', '0').isdigit():
+                    await self.guarded(self.read, scope, receive, send, match.group('api_key'), endpoint, args)
+                    return
+                break
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.dsn is not None:
+                    await self.get_pool()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.pool is not None:
+                    await self.pool.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def get_pool(self):
+        """
+        Creates the asyncpg connection pool on first use
+        :return: the pool
+        """
+        if self.pool is None:
+            if self._pool_lock is None:
+                self._pool_lock = asyncio.Lock()
+            async with self._pool_lock:
+                if self.pool is None:
+                    self.pool = await asyncpg.create_pool(
+                        self.dsn,
+                        min_size=self.flask_app.config.get('ASYNC_POOL_MIN_SIZE', 2),
+                        max_size=self.flask_app.config.get('ASYNC_POOL_MAX_SIZE', 20))
+        return self.pool
+
+    async def guarded(self, handler, scope, receive, send, *args):
+        """
+        Runs a native route, recording its metrics and turning invalid or rate limited keys into responses
+        """
+        start = time.perf_counter()
+        stats = {'statements': 0, 'sql_time': 0.0}
+        try:
+            status = await handler(scope, receive, send, stats, *args)
+        except RateLimited as e:
+            status = 429
+            await respond(send, 429, b"Rate limit exceeded, try again later!", 'text/html; charset=utf-8',
+                          [(b'retry-after', str(e.retry_after).encode())])
+        metrics.observe_request(rule_of(scope['path']), 'GET', status, time.perf_counter() - start,
+                                stats['statements'], stats['sql_time'])
+
+    async def fetch(self, stats, query, *args):
+        """
+        Runs a query on the pool, counting it for the metrics
+        :return: list of records
+        """
+        pool = await self.get_pool()
+        start = time.perf_counter()
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(query, *args)
+        stats['statements'] += 1
+        stats['sql_time'] += time.perf_counter() - start
+        return rows
+
+    async def versions(self, stats) -> tuple:
+        """
+        Reads the shared cache and key versions
+        :param stats: metrics of the current request
+        :return: tuple of (cache version, key version)
+        """
+        rows = await self.fetch(stats, 'SELECT version, key_version FROM cache_version WHERE id = 1')
+        return (rows[0]['version'], rows[0]['key_version']) if rows else (0, 0)
+
+    async def check_key(self, stats, api_key: str, version: int) -> bool:
+        """
+        Same as rideboard_api.check_key, with the database lookup on the pool
+        :param stats: metrics of the current request
+        :param api_key: API key
+        :param version: current key version
+        :return: true if the key exists in the database
+        """
+        digest = key_digest(api_key)
+        valid = key_cache.get(digest, version)
+        if valid is None:
+            rows = await self.fetch(stats, 'SELECT digest FROM "APIKey" WHERE prefix = $1', key_prefix(api_key))
+            valid = matches(digest, [row['digest'] for row in rows])
+            key_cache.set(digest, valid, version)
+        if valid:
+            limiter.hit(digest)
+        return valid
+
+    async def read(self, scope, receive, send, stats, api_key, endpoint, args):
+        # pylint: disable=unused-argument,too-many-arguments
+        version, key_version = await self.versions(stats)
+        if not await self.check_key(stats, api_key, key_version):
+            await respond(send, 403, b"Invalid API Key!", 'text/html; charset=utf-8')
+            return 403
+        key = (endpoint, (), tuple(sorted(args)))
+        # The upcoming event changes when it starts, not only on writes, so it is never served from the cache
+        cacheable = endpoint != 'upcoming_event'
+        cached = response_cache.get(key, version) if cacheable else None
+        if cached is not None:
+            body, etag, _ = cached
+        else:
+            data = await self.load(stats, endpoint, dict(args))
+            if data is None:
+                await respond(send, 404, b"There are no upcoming events!", 'text/html; charset=utf-8')
+                return 404
+            body = serializer.dumps(data)
+            etag = response_cache.set(key, body, {}, version) if cacheable else hashlib.sha1(body).hexdigest()
+        headers = [(b'etag', '"{}"'.format(etag).encode())]
+        if_none_match = dict(scope['headers']).get(b'if-none-match', b'').decode('latin-1')
+        if if_none_match.strip() == '*' or '"{}"'.format(etag) in if_none_match:
+            await respond(send, 304, b'', None, headers)
+            return 304
+        await respond(send, 200, body, 'application/json', headers)
+        return 200
+
+    async def load(self, stats, endpoint: str, args: dict):
+        """
+        Loads the data of a read route in a fixed number of queries, in the same format as the Flask routes
+        :param stats: metrics of the current request
+        :param endpoint: name of the route
+        :param args: query parameters
+        :return: JSON serializable data
+        """
+        fields = parse_fields(args.get('fields'))
+        if endpoint == 'all_cars':
+            if 'id' in args:
+                cars = await self.fetch(stats, 'SELECT {} FROM cars WHERE id = $1'.format(CAR_COLUMNS), int(args['id']))
+            else:
+                cars = await self.fetch(stats, 'SELECT {} FROM cars ORDER BY departure_time, id'.format(CAR_COLUMNS))
+            return await self.cars_json(stats, cars, fields)
+        if endpoint == 'upcoming_event':
+            rides = await self.fetch(stats, 'SELECT {} FROM rides WHERE start_time >= $1 ORDER BY start_time, id '
+                                            'LIMIT 1'.format(RIDE_COLUMNS), datetime.now())
+        elif 'id' in args:
+            rides = await self.fetch(stats, 'SELECT {} FROM rides WHERE id = $1'.format(RIDE_COLUMNS), int(args['id']))
+        else:
+            rides = await self.fetch(stats, 'SELECT {} FROM rides ORDER BY start_time, id'.format(RIDE_COLUMNS))
+        cars = {}
+        if fields is None or 'cars' in fields:
+            car_rows = await self.fetch(stats, 'SELECT {} FROM cars WHERE ride_id = ANY($1::int[]) ORDER BY id'
+                                        .format(CAR_COLUMNS), [ride['id'] for ride in rides])
+            for car in await self.cars_json(stats, car_rows, None):
+                cars.setdefault(car['ride_id'], []).append(car)
+        events = []
+        for ride in rides:
+            event = dict(ride)
+            if fields is None or 'cars' in fields:
+                event['cars'] = cars.get(ride['id'], [])
+            events.append(project(event, fields))
+        if endpoint == 'upcoming_event':
+            return events[0] if events else None
+        return events
+
+    async def cars_json(self, stats, cars: list, fields) -> list:
+        """
+        Turns car rows into the format of return_car_dict, loading their riders in one query
+        """
+        riders = {}
+        if fields is None or 'riders' in fields:
+            rows = await self.fetch(stats, 'SELECT car_id, username FROM riders WHERE car_id = ANY($1::int[]) '
+                                           'ORDER BY id', [car['id'] for car in cars])
+            for row in rows:
+                riders.setdefault(row['car_id'], []).append(row['username'])
+        result = []
+        for car in cars:
+            car_json = dict(car)
+            if fields is None or 'riders' in fields:
+                car_json['riders'] = riders.get(car['id'], [])
+            result.append(project(car_json, fields))
+        return result
+
+    async def stream(self, scope, receive, send, stats, api_key):
+        # pylint: disable=unused-argument,too-many-arguments
+        _, key_version = await self.versions(stats)
+        if not await self.check_key(stats, api_key, key_version):
+            await respond(send, 403, b"Invalid API Key!", 'text/html; charset=utf-8')
+            return 403
+        heartbeat = self.flask_app.config.get('EVENT_STREAM_HEARTBEAT', 15)
+        subscription = broker.subscribe(loop=asyncio.get_event_loop())
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'), (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'), (b'access-control-allow-origin', b'*')]})
+            await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+            while not subscription.closed and not disconnected.done():
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    chunk = ': keep-alive\n\n'
+                else:
+                    chunk = format_event(*event)
+                await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            broker.unsubscribe(subscription)
+        return 200
+
+
+def rule_of(path: str) -> str:
+    """
+    Maps a request path to the Flask URL rule it would match, so both serving modes share metric labels
+    :param path: request path
+    :return: URL rule
+    """
+    return '/<api_key>/' + path.split('/', 2)[2]
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def respond(send, status: int, body: bytes, content_type, headers=None):
+    """
+    Sends a complete response, with the same CORS header flask_cors adds to the API routes
+    """
+    headers = list(headers or [])
+    headers.append((b'access-control-allow-origin', b'*'))
+    if content_type is not None:
+        headers.append((b'content-type', content_type.encode()))
+    headers.append((b'content-length', str(len(body)).encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+application = RideBoardASGI(app)
@@ -0,0 +1,220 @@
+####################################
+# File name: bulk.py               #
+# Author: Ayush Goel               #
+####################################
+from datetime import datetime
+from flask import json
+from sqlalchemy import text
+from rideboard_api import db
+from rideboard_api.models import Ride, Car, Rider
+from rideboard_api.queries import commit_changes, ride_query
+
+TIME_FORMAT = '%a, %d %b %Y %H:%M:%S'
+EXPORT_BATCH_SIZE = 500
+# Rows per multi-row INSERT, keeping each statement under SQLite's limit of 999 parameters
+INSERT_BATCH_SIZE = 100
+
+
+def required(data: dict, field: str, message: str):
+    """
+    Reads a required field from a JSON object
+    :param data: JSON object
+    :param field: name of the field
+    :param message: error message if the field is missing
+    :return: value of the field
+    """
+    if field not in data:
+        raise ValueError(message)
+    return data[field]
+
+
+def parse_time(data: dict, field: str, message: str) -> datetime:
+    """
+    Reads a required time field in the API's time format from a JSON object
+    :param data: JSON object
+    :param field: name of the field
+    :param message: error message if the field is missing
+    :return: datetime
+    """
+    value = required(data, field, message)
+    # Times in the API's own output have a GMT suffix
+    if isinstance(value, str) and value.endswith(' GMT'):
+        value = value[:-4]
+    try:
+        return datetime.strptime(value, TIME_FORMAT)
+    except (TypeError, ValueError):
+        raise ValueError("{} must be in the format '{}'!".format(field, TIME_FORMAT))
+
+
+def parse_event(data: dict) -> Ride:
+    """
+    Builds a Ride from a JSON object in the create/event format
+    :param data: JSON object
+    :return: Ride, not yet added to the session
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Event must be a JSON object!")
+    name = required(data, 'name', "Event name not provided!")
+    address = required(data, 'address', "Event address not provided!")
+    start_time = parse_time(data, 'start_time', "Event start_time not provided!")
+    end_time = parse_time(data, 'end_time', "Event end_time not provided!")
+    creator = required(data, 'creator', "Event creator not provided!")
+    return Ride(name, address, start_time, end_time, creator)
+
+
+def parse_car(data: dict, ride_id) -> Car:
+    """
+    Builds a Car from a JSON object in the create/car format
+    :param data: JSON object
+    :param ride_id: id of the Ride the car belongs to
+    :return: Car, not yet added to the session
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Car must be a JSON object!")
+    name = required(data, 'name', "Car creator's name not provided!")
+    username = required(data, 'username', "Car creator's username not provided!")
+    departure_time = parse_time(data, 'departure_time', "Car's departure_time not provided!")
+    return_time = parse_time(data, 'return_time', "Car's return_time not provided!")
+    max_capacity = required(data, 'max_capacity', "Car max_capacity not provided!")
+    try:
+        max_capacity = int(max_capacity)
+    except (TypeError, ValueError):
+        raise ValueError("Car max_capacity must be a number!")
+    driver_comment = data.get('driver_comment', "No comments provided.")
+    return Car(username, name, 0, max_capacity, departure_time, return_time, driver_comment, ride_id)
+
+
+def parse_rider(data) -> tuple:
+    """
+    Reads a rider given either as a username or as a JSON object with a username and name
+    :param data: username or JSON object
+    :return: tuple of (username, name)
+    """
+    if isinstance(data, str):
+        return data, data
+    if isinstance(data, dict) and 'username' in data:
+        return data['username'], data.get('name', data['username'])
+    raise ValueError("Riders must be usernames or JSON objects with a username!")
+
+
+def column_values(obj, table) -> dict:
+    """
+    :return: the column values of a model object, without its id
+    """
+    return {column.name: getattr(obj, column.name) for column in table.columns if column.name != 'id'}
+
+
+def insert_rows(model, rows: list) -> list:
+    """
+    Inserts rows with multi-row INSERT statements of up to INSERT_BATCH_SIZE rows each.
+    On PostgreSQL the ids are taken from the table's sequence first, in one statement per batch.
+    SQLite numbers the rows of one statement consecutively, so their ids end at the last inserted rowid.
+    :param model: model of the table
+    :param rows: list of dicts of column values, without ids
+    :return: ids of the inserted rows, in order
+    """
+    table = model.__table__
+    postgres = db.session.get_bind(model.__mapper__).dialect.name == 'postgresql'
+    ids = []
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        batch = rows[start:start + INSERT_BATCH_SIZE]
+        if postgres:
+            batch_ids = [row[0] for row in db.session.execute(
+                text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"),
+                {'table': table.name, 'count': len(batch)})]
+            db.session.execute(table.insert().values([dict(row, id=row_id) for row, row_id in zip(batch, batch_ids)]))
+        else:
+            last_id = db.session.execute(table.insert().values(batch)).lastrowid
+            batch_ids = list(range(last_id - len(batch) + 1, last_id + 1))
+        ids.extend(batch_ids)
+    return ids
+
+
+def import_events(events: list) -> dict:
+    """
+    Inserts events with their cars and riders in a single transaction, with multi-row inserts per table.
+    Each event gets a Need a Ride car, unless the import already has one for it.
+    :param events: list of JSON objects in the create/event format, with an optional list of cars,
+                   each with an optional list of riders
+    :return: ids of the new rides and the number of rows inserted per table
+    """
+    rides = []
+    # Cars of each ride, as lists of (Car, riders)
+    ride_cars = []
+    for index, data in enumerate(events):
+        try:
+            ride = parse_event(data)
+            cars = []
+            car_list = data.get('cars', [])
+            if not isinstance(car_list, list):
+                raise ValueError("Event cars must be a list!")
+            for car_data in car_list:
+                car = parse_car(car_data, None)
+                riders = [parse_rider(rider) for rider in car_data.get('riders', [])]
+                if 0 < car.max_capacity < len(riders):
+                    raise ValueError("Car of {} has more riders than seats!".format(car.username))
+                car.current_capacity = len(riders)
+                if car.max_capacity > 0:
+                    ride.open_seats += car.max_capacity - car.current_capacity
+                cars.append((car, riders))
+            if not any(car.username == '∞' for car, _ in cars):
+                cars.append((Car('∞', 'Need a Ride', 0, 0, ride.start_time, ride.end_time, "", None), []))
+        except ValueError as e:
+            raise ValueError("Event {}: {}".format(index, e))
+        rides.append(ride)
+        ride_cars.append(cars)
+
+    ride_ids = insert_rows(Ride, [column_values(ride, Ride.__table__) for ride in rides])
+    for ride_id, cars in zip(ride_ids, ride_cars):
+        for car, _ in cars:
+            car.ride_id = ride_id
+    all_cars = [car for cars in ride_cars for car in cars]
+    car_ids = insert_rows(Car, [column_values(car, Car.__table__) for car, _ in all_cars])
+    riders = [{'username': username, 'name': name, 'car_id': car_id, 'ride_id': car.ride_id}
+              for car_id, (car, car_riders) in zip(car_ids, all_cars) for username, name in car_riders]
+    insert_rows(Rider, riders)
+    commit_changes()
+    return {
+        'ride_ids': ride_ids,
+        'rides': len(rides),
+        'cars': len(all_cars),
+        'riders': len(riders)
+    }
+
+
+def read_ndjson(lines) -> list:
+    """
+    Parses newline delimited JSON
+    :param lines: iterable of lines, as bytes or str
+    :return: list of parsed objects
+    """
+    events = []
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            events.append(json.loads(line))
+        except ValueError:
+            raise ValueError("Line {} is not valid JSON!".format(number))
+    return events
+
+
+def export_events(encode):
+    """
+    Yields every event as a line of newline delimited JSON, loading rides in id order in fixed size batches
+    so memory stays flat no matter how many rides there are.
+    :param encode: function turning a Ride into JSON bytes
+    :return: generator of lines
+    """
+    last_id = 0
+    while True:
+        rides = ride_query().filter(Ride.id > last_id).order_by(Ride.id.asc()).limit(EXPORT_BATCH_SIZE).all()
+        if not rides:
+            return
+        for ride in rides:
+            yield encode(ride) + b'\n'
+        last_id = rides[-1].id
+        # Drop the batch from the session before loading the next one
+        db.session.expunge_all()
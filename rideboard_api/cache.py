@@ -0,0 +1,252 @@
+####################################
+# File name: cache.py              #
+# Author: Ayush Goel               #
+####################################
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+
+class KeyCache:
+    """
+    In-process cache of API key verification results.
+    Valid keys are kept in a bounded LRU with a TTL, invalid keys in a separate, short-lived negative cache.
+    Entries are stored with the shared key version they were checked at and only served while it is current,
+    so a key created or revoked on one worker is seen by every worker.
+    """
+
+    def __init__(self, max_size=1024, ttl=300, negative_max_size=4096, negative_ttl=10):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_max_size = negative_max_size
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._valid = OrderedDict()
+        self._invalid = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str, version: int):
+        """
+        Looks up a key in the cache
+        :param api_key: API key
+        :param version: current key version
+        :return: True or False if the result is cached, None on a miss
+        """
+        now = time.monotonic()
+        with self._lock:
+            for entries, result in ((self._valid, True), (self._invalid, False)):
+                entry = entries.get(api_key)
+                if entry is None:
+                    continue
+                expires, entry_version = entry
+                if expires > now and entry_version == version:
+                    entries.move_to_end(api_key)
+                    self.hits += 1
+                    return result
+                del entries[api_key]
+            self.misses += 1
+            return None
+
+    def set(self, api_key: str, valid: bool, version: int):
+        """
+        Stores the verification result of a key
+        :param api_key: API key
+        :param valid: whether the key exists in the database
+        :param version: key version read before the key was looked up
+        """
+        if valid:
+            entries, max_size, ttl = self._valid, self.max_size, self.ttl
+        else:
+            entries, max_size, ttl = self._invalid, self.negative_max_size, self.negative_ttl
+        if max_size <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            entries[api_key] = (time.monotonic() + ttl, version)
+            entries.move_to_end(api_key)
+            while len(entries) > max_size:
+                entries.popitem(last=False)
+
+    def invalidate(self, api_key: str = None):
+        """
+        Drops a key from the cache, or every key if none is given
+        :param api_key: API key
+        """
+        with self._lock:
+            if api_key is None:
+                self._valid.clear()
+                self._invalid.clear()
+            else:
+                self._valid.pop(api_key, None)
+                self._invalid.pop(api_key, None)
+
+    def stats(self) -> dict:
+        """
+        Returns the hit/miss counters and current size of the cache
+        :return: dict of cache statistics
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'valid': len(self._valid),
+                'invalid': len(self._invalid)
+            }
+
+
+class RenderedFile:
+    """
+    Caches the rendered contents of a file, re-rendering only when its mtime changes.
+    """
+
+    def __init__(self, path: str, render):
+        self.path = path
+        self.render = render
+        self.mtime = None
+        self.body = None
+        self.etag = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Returns the rendered file, rendering it if it changed since the last call
+        :return: tuple of (body, etag, mtime as a datetime)
+        """
+        mtime = os.path.getmtime(self.path)
+        with self._lock:
+            if mtime != self.mtime:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.body = self.render(f.read())
+                self.etag = hashlib.sha1(self.body.encode()).hexdigest()
+                self.mtime = mtime
+            return self.body, self.etag, datetime.utcfromtimestamp(int(self.mtime))
+
+
+class ResponseCache:
+    """
+    In-process LRU cache of rendered GET responses.
+    Entries are stored with the shared cache version they were built at and only served while it is current.
+    """
+
+    def __init__(self, max_size=256, ttl=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version: int):
+        """
+        Looks up a cached response
+        :param key: cache key of the request
+        :param version: current cache version
+        :return: tuple of (body, etag, headers) or None on a miss
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2:]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def set(self, key, body: bytes, headers: dict, version: int):
+        """
+        Stores a response and returns its strong ETag
+        :param key: cache key of the request
+        :param body: response body
+        :param headers: extra response headers to replay on a hit
+        :param version: cache version read before the response was built
+        :return: ETag of the body
+        """
+        etag = hashlib.sha1(body).hexdigest()
+        if self.max_size <= 0 or self.ttl <= 0:
+            return etag
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, body, etag, headers)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return etag
+
+    def invalidate(self):
+        """
+        Drops every cached response of this worker
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns the hit/miss counters and current size of the cache
+        :return: dict of cache statistics
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries)
+            }
+
+
+class UpcomingCache:
+    """
+    The next few rides as rendered JSON, ordered by start_time, valid while the shared cache version is unchanged.
+    Rides that have started since it was filled are skipped, so most reads never load rides.
+    """
+
+    def __init__(self, size=20, ttl=60):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        self._rides = None
+        self._complete = False
+        self._expires = 0
+        self._lock = threading.Lock()
+
+    def get(self, limit: int, now: datetime, version: int):
+        """
+        Returns the next rides starting at or after now
+        :param limit: number of rides wanted
+        :param now: current time
+        :param version: current cache version
+        :return: list of up to limit rides, or None if the cache can't answer
+        """
+        with self._lock:
+            if self._rides is not None and self._version == version and self._expires > time.monotonic():
+                rides = [ride for start_time, ride in self._rides if start_time >= now]
+                if len(rides) >= limit or self._complete:
+                    self.hits += 1
+                    return rides[:limit]
+            self.misses += 1
+            return None
+
+    def set(self, rides: list, complete: bool, version: int):
+        """
+        Fills the cache
+        :param rides: list of (start_time, ride JSON) of the next rides, in order
+        :param complete: true if there are no more upcoming rides than these
+        :param version: cache version read before the rides were loaded
+        """
+        with self._lock:
+            if self.ttl > 0:
+                self._version = version
+                self._rides = rides
+                self._complete = complete
+                self._expires = time.monotonic() + self.ttl
+
+    def invalidate(self):
+        """
+        Drops the cached rides
+        """
+        with self._lock:
+            self._rides = None
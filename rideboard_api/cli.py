@@ -0,0 +1,59 @@
+####################################
+# File name: cli.py                #
+# Author: Ayush Goel               #
+####################################
+import click
+from sqlalchemy import text
+from rideboard_api import app, db
+from rideboard_api.analytics import export_tables
+from rideboard_api.jobs import archive_ended_rides, reconcile_seats
+from rideboard_api.keys import key_prefix, key_digest
+
+
+@app.cli.command('reconcile-seats')
+def reconcile_seats_command():
+    """
+    Recomputes the open_seats count of every event from its cars.
+    """
+    click.echo("Updated open_seats for {} events.".format(reconcile_seats()))
+
+
+@app.cli.command('archive-rides')
+@click.option('--days', default=0, help="Only archive rides that ended at least this many days ago.")
+def archive_rides_command(days):
+    """
+    Moves rides that have ended, with their cars and riders, to the history tables.
+    """
+    archived = archive_ended_rides(days, app.config.get('ARCHIVE_BATCH_SIZE', 500))
+    click.echo("Archived {} events.".format(archived))
+
+
+@app.cli.command('hash-api-keys')
+def hash_api_keys_command():
+    """
+    Replaces the plaintext keys of migrations/005_hashed_api_keys.sql with their prefix and digest.
+    """
+    if not app.config.get('API_KEY_SECRET'):
+        raise click.ClickException("API_KEY_SECRET is not set, refusing to hash keys without it.")
+    rows = db.session.execute(text('SELECT id, hash FROM "APIKey" WHERE hash IS NOT NULL')).fetchall()
+    for key_id, api_key in rows:
+        db.session.execute(text('UPDATE "APIKey" SET prefix = :prefix, digest = :digest, hash = NULL WHERE id = :id'),
+                           {'prefix': key_prefix(api_key), 'digest': key_digest(api_key), 'id': key_id})
+    db.session.commit()
+    click.echo("Hashed {} API keys.".format(len(rows)))
+
+
+@app.cli.command('export-analytics')
+@click.argument('directory')
+@click.option('--format', 'export_format', default='csv', type=click.Choice(['csv', 'arrow', 'parquet']))
+@click.option('--history', is_flag=True, help="Export the archived rides instead.")
+def export_analytics_command(directory, export_format, history):
+    """
+    Writes the rides, cars, riders and seats per event tables to files in DIRECTORY.
+    """
+    try:
+        counts = export_tables(directory, export_format, history)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for table, count in counts.items():
+        click.echo("Wrote {} {} rows.".format(count, table))
@@ -0,0 +1,80 @@
+####################################
+# File name: database.py           #
+# Author: Ayush Goel               #
+####################################
+from flask import g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, orm
+from sqlalchemy.engine.url import make_url
+
+# Routes that only read, and may be served from the read replica
+READ_ENDPOINTS = {'all_events', 'all_cars', 'upcoming_event', 'user_rides', 'export_data',
+                  'export_analytics'}
+
+
+def engine_options(config, drivername: str) -> dict:
+    """
+    Builds the connection pool options from the app config.
+    SQLite keeps SQLAlchemy's defaults, its pools don't take these options.
+    :param config: app config
+    :param drivername: SQLAlchemy driver name, e.g. postgresql+psycopg2
+    :return: keyword arguments for create_engine
+    """
+    if drivername.startswith('sqlite'):
+        return {}
+    options = {
+        'pool_size': config.get('DATABASE_POOL_SIZE', 5),
+        'max_overflow': config.get('DATABASE_MAX_OVERFLOW', 10),
+        'pool_timeout': config.get('DATABASE_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DATABASE_POOL_RECYCLE', 1800),
+        'pool_pre_ping': config.get('DATABASE_POOL_PRE_PING', True)
+    }
+    timeout = config.get('DATABASE_STATEMENT_TIMEOUT', 0)
+    if timeout and drivername.startswith('postgres'):
+        options['connect_args'] = {'options': '-c statement_timeout={}'.format(int(timeout))}
+    return options
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session sending the queries of read only routes to the read replica, when one is configured,
+    unless the request was told to read from the primary because of a recent write.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        # pylint: disable=arguments-differ
+        replica = self.app.extensions['sqlalchemy'].db.get_replica_engine(self.app)
+        if replica is not None and not self._flushing and has_request_context() \
+                and request.endpoint in READ_ENDPOINTS and not g.get('read_primary'):
+            return replica
+        return super().get_bind(mapper, clause)
+
+
+class RideBoardSQLAlchemy(SQLAlchemy):
+    """
+    SQLAlchemy with configurable pool settings and an optional read replica.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._replica_engine = None
+        super().__init__(*args, **kwargs)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, info, options):
+        super().apply_driver_hacks(app, info, options)
+        options.update(engine_options(app.config, info.drivername))
+
+    def get_replica_engine(self, app):
+        """
+        Creates the read replica engine on first use
+        :param app: Flask app
+        :return: Engine, or None if DATABASE_READ_REPLICA_URI isn't set
+        """
+        uri = app.config.get('DATABASE_READ_REPLICA_URI')
+        if not uri:
+            return None
+        if self._replica_engine is None:
+            self._replica_engine = create_engine(uri, **engine_options(app.config, make_url(uri).drivername))
+        return self._replica_engine
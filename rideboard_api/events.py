@@ -0,0 +1,121 @@
+####################################
+# File name: events.py             #
+# Author: Ayush Goel               #
+####################################
+import asyncio
+import itertools
+import queue
+import threading
+
+
+class Subscription:
+    """
+    A single stream client's queue of (id, event type, data) tuples.
+    """
+
+    def __init__(self, max_size: int):
+        self.queue = queue.Queue(max_size)
+        self.closed = False
+
+    def deliver(self, event: tuple) -> bool:
+        """
+        Queues an event for the client
+        :param event: tuple of (id, event type, data)
+        :return: false if the client fell too far behind
+        """
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            return False
+        return True
+
+
+class AsyncSubscription(Subscription):
+    """
+    A stream client served from an asyncio event loop. Events published from other threads are handed to the loop.
+    """
+
+    def __init__(self, max_size: int, loop):
+        super().__init__(max_size)
+        self.loop = loop
+        self.queue = asyncio.Queue(max_size)
+
+    def deliver(self, event: tuple) -> bool:
+        if self.closed:
+            return False
+        self.loop.call_soon_threadsafe(self._put, event)
+        return True
+
+    def _put(self, event: tuple):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.closed = True
+
+
+class LocalBroker:
+    """
+    In-process pub/sub for ride board changes.
+    Only reaches stream clients of the same worker; a broker backed by e.g. Redis pub/sub can replace it
+    by implementing the same subscribe, unsubscribe and publish methods.
+    """
+
+    def __init__(self, max_queue_size=100):
+        self.max_queue_size = max_queue_size
+        self._ids = itertools.count(1)
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, loop=None) -> Subscription:
+        """
+        Registers a new stream client
+        :param loop: asyncio event loop of the client, None for a client served by a worker thread
+        :return: Subscription receiving every event published from now on
+        """
+        if loop is None:
+            subscription = Subscription(self.max_queue_size)
+        else:
+            subscription = AsyncSubscription(self.max_queue_size, loop)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """
+        Removes a stream client
+        :param subscription: Subscription returned by subscribe
+        """
+        subscription.closed = True
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event_type: str, data: str):
+        """
+        Sends an event to every stream client. Clients that fall too far behind are disconnected.
+        :param event_type: name of the event
+        :param data: event payload, already encoded as JSON
+        """
+        event = (next(self._ids), event_type, data)
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if not subscription.deliver(event):
+                self.unsubscribe(subscription)
+
+    def subscribers(self) -> int:
+        """
+        :return: number of connected stream clients
+        """
+        with self._lock:
+            return len(self._subscriptions)
+
+
+def format_event(event_id: int, event_type: str, data: str) -> str:
+    """
+    Formats an event for a text/event-stream response
+    :param event_id: id of the event
+    :param event_type: name of the event
+    :param data: event payload, encoded as JSON
+    :return: the event as a server-sent events message
+    """
+    return 'id: {}\nevent: {}\ndata: {}\n\n'.format(event_id, event_type, data)
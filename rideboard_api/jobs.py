@@ -0,0 +1,135 @@
+####################################
+# File name: jobs.py               #
+# Author: Ayush Goel               #
+####################################
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from rideboard_api import db, data_changed, readme, upcoming_cache, upcoming_rides
+from rideboard_api.models import Ride
+from rideboard_api.queries import commit_changes, reconcile_open_seats, remove_rides
+
+
+def archive_ended_rides(days=0, batch_size=500) -> int:
+    """
+    Moves rides that ended at least days ago to the history tables, batch_size rides per transaction,
+    so no transaction holds its locks for long however many rides have piled up.
+    :param days: only archive rides that ended at least this many days ago
+    :param batch_size: rides per transaction
+    :return: number of rides archived
+    """
+    cutoff = datetime.now() - timedelta(days=days)
+    archived = 0
+    while True:
+        ride_ids = [row[0] for row in db.session.execute(
+            select([Ride.id]).where(Ride.end_time < cutoff).order_by(Ride.id).limit(batch_size))]
+        if not ride_ids:
+            return archived
+        archived += remove_rides(Ride.id.in_(ride_ids), archive=True)
+        commit_changes()
+        data_changed('rides_archived', {'ride_ids': ride_ids})
+
+
+def reconcile_seats() -> int:
+    """
+    Recomputes the open_seats count of every ride, in a single statement
+    :return: number of rides updated
+    """
+    updated = reconcile_open_seats()
+    data_changed('seats_reconciled', {'rides': updated})
+    return updated
+
+
+def warm_caches():
+    """
+    Renders the README and fills the upcoming cache of this worker, so requests don't wait on them
+    """
+    readme.get()
+    upcoming_rides(upcoming_cache.size)
+
+
+class JobRunner:
+    """
+    Runs jobs every few seconds on a background thread, each in its own app context and session.
+    A failing job is logged and retried at its next run.
+    """
+
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self.jobs = []
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def add(self, name: str, function, interval: float):
+        """
+        Schedules a job, first run as soon as the runner starts
+        :param name: name of the job, for the log
+        :param function: function to run
+        :param interval: seconds between runs, 0 disables the job
+        """
+        if interval > 0:
+            self.jobs.append({'name': name, 'function': function, 'interval': interval, 'next_run': 0})
+
+    def run_pending(self):
+        """
+        Runs every job that is due
+        """
+        for job in self.jobs:
+            if job['next_run'] <= time.monotonic():
+                self.run(job)
+                job['next_run'] = time.monotonic() + job['interval']
+
+    def run(self, job: dict):
+        with self.app.app_context():
+            start = time.perf_counter()
+            try:
+                result = job['function']()
+            except Exception:  # pylint: disable=broad-except
+                db.session.rollback()
+                self.app.logger.exception("Job %s failed", job['name'])
+            else:
+                self.app.logger.info("Job %s finished in %.3fs: %s", job['name'], time.perf_counter() - start, result)
+            finally:
+                db.session.remove()
+
+    def run_forever(self):
+        """
+        Runs jobs as they come due until stop is called
+        """
+        while self.jobs and not self.stopped.is_set():
+            self.run_pending()
+            self.stopped.wait(max(0, min(job['next_run'] for job in self.jobs) - time.monotonic()))
+
+    def start(self):
+        """
+        Runs the jobs on a daemon thread, so they never hold up a request
+        """
+        if self.jobs and self.thread is None:
+            self.thread = threading.Thread(target=self.run_forever, name='rideboard-jobs')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def maintenance_jobs(flask_app) -> JobRunner:
+    """
+    Jobs of the separate worker process (worker.py): archiving ended rides and reconciling seat counts
+    """
+    runner = JobRunner(flask_app)
+    runner.add('archive-rides', lambda: archive_ended_rides(flask_app.config.get('ARCHIVE_AFTER_DAYS', 0),
+                                                            flask_app.config.get('ARCHIVE_BATCH_SIZE', 500)),
+               flask_app.config.get('ARCHIVE_INTERVAL', 3600))
+    runner.add('reconcile-seats', reconcile_seats, flask_app.config.get('RECONCILE_INTERVAL', 3600))
+    return runner
+
+
+def cache_jobs(flask_app) -> JobRunner:
+    """
+    Jobs of every web worker: the caches are per process, so each warms its own
+    """
+    runner = JobRunner(flask_app)
+    runner.add('warm-caches', warm_caches, flask_app.config.get('CACHE_WARM_INTERVAL', 0))
+    return runner
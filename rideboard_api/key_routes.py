@@ -0,0 +1,111 @@
+####################################
+# File name: key_routes.py         #
+# Author: Ayush Goel               #
+####################################
+from flask_cors import cross_origin
+from rideboard_api import app, auth, db, limiter, json_response
+from rideboard_api.models import APIKey
+from rideboard_api.queries import bump_key_version
+from rideboard_api.utils import user_auth
+
+
+@app.route('/generatekey/<reason>', methods=['GET'])
+@auth.oidc_auth
+@user_auth
+def generate_api_key(reason: str, metadata=None):
+    """
+    Creates an API key for the user requested.
+    Using a reason and the username grabbed through the @auth.oidc_auth call
+    :param reason: Reason for the API key
+    :param metadata: auth dictionary
+    :return: the Key, which is only shown this once, or a String stating an error
+    """
+    if not app.config.get('API_KEY_SECRET'):
+        return "API_KEY_SECRET is not set, no keys can be issued until it is.", 500
+    if not check_key_unique(metadata['uid'], reason):
+        if metadata['is_rtp'] or metadata['uid'] == 'agoel':
+            # Creates the new API key
+            new_key = APIKey(metadata['uid'], reason)
+            # Adds the new object and drops every worker's cached verifications, in one transaction
+            db.session.add(new_key)
+            bump_key_version()
+            db.session.commit()
+            return new_key.key
+        return "You are not authorized to see this.", 403
+    return "There's already a key with this reason for this user!", 400
+
+
+@app.route('/revokekey/<reason>', methods=['GET'])
+@auth.oidc_auth
+@user_auth
+def revoke_api_key(reason: str, metadata=None):
+    """
+    Deletes the API key the user generated for the given reason.
+    :param reason: Reason the API key was generated for
+    :param metadata: auth dictionary
+    :return: Varying status code with message depending on outcome.
+    """
+    key = APIKey.query.filter_by(owner=metadata['uid'], reason=reason).first()
+    if key is not None:
+        db.session.delete(key)
+        bump_key_version()
+        db.session.commit()
+        return "Deletion Successful", 200
+    return "There's no key with this reason for this user!", 400
+
+
+@app.route('/listapikeys', methods=['GET'])
+@auth.oidc_auth
+@user_auth
+@cross_origin(headers=['Content-Type'])
+def list_api_keys(metadata=None):
+    if metadata['is_rtp'] or metadata['uid'] == 'agoel':
+        keys = APIKey.query.all()
+        return parse_apikeys_as_json(keys, usage=limiter.usage([key.digest for key in keys]))
+    return "You are not authorized to see this.", 403
+
+
+def check_key_unique(owner: str, reason: str) -> bool:
+    """
+    Checks if the key exists using the owner and the reason
+    :param owner: generator of the key
+    :param reason: reason provided for the key
+    :return: true if the key exists uniquely
+    """
+    keys = APIKey.query.filter_by(owner=owner, reason=reason).all()
+    if keys:
+        return True
+    return False
+
+
+def return_apikey_json(key: APIKey, usage=None):
+    """
+    Returns an APIKey Object as JSON
+    :param key: The APIKey object being formatted
+    :param usage: the key's usage counters
+    :return: Returns the APIKey object formatted to return as JSON
+    """
+    return {
+        'id': key.id,
+        'owner': key.owner,
+        'prefix': key.prefix,
+        'reason': key.reason,
+        'usage': usage
+    }
+
+
+def parse_apikeys_as_json(keys: list, key_json=None, usage=None) -> list:
+    """
+    Builds a list of APIKey as JSON
+    :param keys: List of APIKey Objects
+    :param key_json: List of APIKey Objects as dicts
+    :param usage: dict of key digest to its usage counters
+    :return: Returns a list of APIKey Objects as dicts
+    """
+    if key_json is None:
+        key_json = []
+    if usage is None:
+        usage = {}
+    for key in keys:
+        key_json.append(return_apikey_json(key, usage.get(key.digest)))
+    return json_response(key_json)
@@ -0,0 +1,52 @@
+####################################
+# File name: keys.py               #
+# Author: Ayush Goel               #
+####################################
+import hashlib
+import hmac
+from uuid import uuid4
+from rideboard_api import app
+
+# Characters of a key stored in the clear, to find its row and tell keys apart in /listapikeys
+PREFIX_LENGTH = 8
+
+if not app.config.get('API_KEY_SECRET'):
+    app.logger.error("API_KEY_SECRET is not set, /generatekey and flask hash-api-keys refuse to run until it is.")
+
+
+def generate_key() -> str:
+    """
+    :return: a new random API key
+    """
+    return uuid4().hex
+
+
+def key_prefix(api_key: str) -> str:
+    """
+    :param api_key: API key
+    :return: the part of the key stored in the clear
+    """
+    return api_key[:PREFIX_LENGTH]
+
+
+def key_digest(api_key: str) -> str:
+    """
+    Computes the stored form of a key, an HMAC-SHA256 keyed with API_KEY_SECRET
+    :param api_key: API key
+    :return: hex digest
+    """
+    secret = app.config.get('API_KEY_SECRET', '').encode('utf-8')
+    return hmac.new(secret, api_key.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def matches(digest: str, candidates) -> bool:
+    """
+    Compares a digest with the stored digests sharing its key's prefix, in constant time
+    :param digest: digest of the presented key
+    :param candidates: stored digests
+    :return: true if one of them is the digest
+    """
+    found = False
+    for candidate in candidates:
+        found |= hmac.compare_digest(candidate, digest)
+    return found
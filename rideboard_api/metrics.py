@@ -0,0 +1,132 @@
+####################################
+# File name: metrics.py            #
+# Author: Ayush Goel               #
+####################################
+import threading
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def escape(value) -> str:
+    """
+    Escapes a label value for the Prometheus text format
+    :param value: label value
+    :return: escaped value
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def labels(**values) -> str:
+    """
+    Formats labels for the Prometheus text format
+    :return: e.g. {route="/",method="GET"}
+    """
+    return '{' + ','.join('{}="{}"'.format(name, escape(value)) for name, value in sorted(values.items())) + '}'
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets.
+    """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.count = 0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self, name: str, label_values: dict) -> list:
+        lines = []
+        for bound, count in zip(self.buckets, self.counts):
+            lines.append('{}_bucket{} {}'.format(name, labels(le=bound, **label_values), count))
+        lines.append('{}_bucket{} {}'.format(name, labels(le='+Inf', **label_values), self.count))
+        lines.append('{}_sum{} {}'.format(name, labels(**label_values), self.total))
+        lines.append('{}_count{} {}'.format(name, labels(**label_values), self.count))
+        return lines
+
+
+class Metrics:
+    """
+    Per route request, latency and SQL metrics of this process, rendered in the Prometheus text format.
+    """
+
+    def __init__(self, prefix='rideboard'):
+        self.prefix = prefix
+        self._requests = {}
+        self._errors = {}
+        self._latency = {}
+        self._statements = {}
+        self._sql_time = {}
+        self._lock = threading.Lock()
+
+    def observe_request(self, route: str, method: str, status: int, seconds: float, statements: int,
+                        sql_seconds: float):
+        """
+        Records a finished request
+        :param route: URL rule that matched, e.g. /<api_key>/all
+        :param method: HTTP method
+        :param status: response status code
+        :param seconds: time spent handling the request
+        :param statements: number of SQL statements executed
+        :param sql_seconds: time spent executing them
+        """
+        with self._lock:
+            key = (route, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            if status >= 400:
+                self._errors[status] = self._errors.get(status, 0) + 1
+            key = (route, method)
+            self._latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self._statements.setdefault(key, Histogram(STATEMENT_BUCKETS)).observe(statements)
+            self._sql_time[key] = self._sql_time.get(key, 0.0) + sql_seconds
+
+    def render(self, gauges=None) -> str:
+        """
+        Renders every metric in the Prometheus text format
+        :param gauges: extra values to export, as a dict of name to (help, type, value)
+        :return: metrics page
+        """
+        name = self.prefix + '_requests_total'
+        lines = ['# HELP {} Requests handled, by route, method and status.'.format(name),
+                 '# TYPE {} counter'.format(name)]
+        with self._lock:
+            for (route, method, status), count in sorted(self._requests.items()):
+                lines.append('{}{} {}'.format(name, labels(route=route, method=method, status=status), count))
+
+            name = self.prefix + '_http_errors_total'
+            lines += ['# HELP {} Responses with an error status code, by status.'.format(name),
+                      '# TYPE {} counter'.format(name)]
+            for status, count in sorted(self._errors.items()):
+                lines.append('{}{} {}'.format(name, labels(status=status), count))
+
+            name = self.prefix + '_request_duration_seconds'
+            lines += ['# HELP {} Time spent handling requests, by route and method.'.format(name),
+                      '# TYPE {} histogram'.format(name)]
+            for (route, method), histogram in sorted(self._latency.items()):
+                lines += histogram.render(name, {'route': route, 'method': method})
+
+            name = self.prefix + '_sql_statements'
+            lines += ['# HELP {} SQL statements executed per request, by route and method.'.format(name),
+                      '# TYPE {} histogram'.format(name)]
+            for (route, method), histogram in sorted(self._statements.items()):
+                lines += histogram.render(name, {'route': route, 'method': method})
+
+            name = self.prefix + '_sql_duration_seconds_total'
+            lines += ['# HELP {} Time spent executing SQL statements, by route and method.'.format(name),
+                      '# TYPE {} counter'.format(name)]
+            for (route, method), seconds in sorted(self._sql_time.items()):
+                lines.append('{}{} {}'.format(name, labels(route=route, method=method), seconds))
+
+        for gauge, (description, metric_type, value) in sorted((gauges or {}).items()):
+            name = '{}_{}'.format(self.prefix, gauge)
+            lines += ['# HELP {} {}'.format(name, description), '# TYPE {} {}'.format(name, metric_type),
+                      '{} {}'.format(name, value)]
+        return '\n'.join(lines) + '\n'
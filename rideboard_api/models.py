@@ -2,21 +2,26 @@
 # File name: models.py             #
 # Author: Ayush Goel               #
 ####################################
-from uuid import uuid4
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import DDL, Index, UniqueConstraint, event, func
 from rideboard_api import db
+from rideboard_api.keys import generate_key, key_prefix, key_digest
 
 class APIKey(db.Model):
     __tablename__ = 'APIKey'
 
     id = db.Column(db.Integer, primary_key=True)
-    hash = db.Column(db.String(64), unique=True)
+    # Only the first characters and a keyed digest of the key are stored, the key itself is shown once
+    prefix = db.Column(db.String(8), nullable=False, index=True)
+    digest = db.Column(db.String(64), nullable=False, unique=True)
     owner = db.Column(db.String(80))
     reason = db.Column(db.String(120))
     __table_args__ = (UniqueConstraint('owner', 'reason', name='unique_key'),)
 
     def __init__(self, owner, reason):
-        self.hash = uuid4().hex
+        # Not a column, only available on the instance that generated the key
+        self.key = generate_key()
+        self.prefix = key_prefix(self.key)
+        self.digest = key_digest(self.key)
         self.owner = owner
         self.reason = reason
 
@@ -29,9 +34,11 @@ class Ride(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(150), nullable=False)
     address = db.Column(db.Text, nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False, index=True)
     end_time = db.Column(db.DateTime, nullable=False)
     creator = db.Column(db.String(50), nullable=False)
+    # Sum of free seats over the cars with a max_capacity, kept up to date by the write routes
+    open_seats = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
     cars = db.relationship('Car', backref='rides', lazy=True)
 
     def __init__(self, name, address, start_time, end_time, creator):
@@ -40,6 +47,7 @@ class Ride(db.Model):
         self.start_time = start_time
         self.end_time = end_time
         self.creator = creator
+        self.open_seats = 0
 
     def __repr__(self):
         return '<id {}>'.format(self.id)
@@ -48,7 +56,7 @@ class Car(db.Model):
     __tablename__ = 'cars'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    username = db.Column(db.String(80), nullable=False)
+    username = db.Column(db.String(80), nullable=False, index=True)
     name = db.Column(db.String(50), nullable=False)
     current_capacity = db.Column(db.Integer, nullable=False)
     max_capacity = db.Column(db.Integer, nullable=False)
@@ -57,6 +65,7 @@ class Car(db.Model):
     driver_comment = db.Column(db.Text)
     ride_id = db.Column(db.Integer, db.ForeignKey('rides.id'), nullable=False)
     riders = db.relationship('Rider', backref='cars', lazy=True)
+    __table_args__ = (Index('ix_cars_ride_id_username', 'ride_id', 'username'),)
 
     def __init__(self, username, name, current_capacity, max_capacity,
          departure_time, return_time, driver_comment, ride_id):
@@ -76,14 +85,83 @@ class Rider(db.Model):
     __tablename__ = 'riders'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    username = db.Column(db.String(80), nullable=False)
+    username = db.Column(db.String(80), nullable=False, index=True)
     name = db.Column(db.String(50), nullable=False)
     car_id = db.Column(db.Integer, db.ForeignKey('cars.id'), nullable=False)
+    # Copy of the car's ride_id, so a user can only ride in one car per event
+    ride_id = db.Column(db.Integer, db.ForeignKey('rides.id'), nullable=False)
+    __table_args__ = (Index('ix_riders_car_id_username', 'car_id', 'username'),
+                      UniqueConstraint('ride_id', 'username', name='unique_rider'))
 
-    def __init__(self, username, name, car_id):
+    def __init__(self, username, name, car_id, ride_id):
         self.username = username
         self.name = name
         self.car_id = car_id
+        self.ride_id = ride_id
+
+    def __repr__(self):
+        return '<id {}>'.format(self.id)
+
+class RideHistory(db.Model):
+    __tablename__ = 'rides_history'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(150), nullable=False)
+    address = db.Column(db.Text, nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False, index=True)
+    end_time = db.Column(db.DateTime, nullable=False)
+    creator = db.Column(db.String(50), nullable=False)
+    open_seats = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False, server_default=func.now())
 
     def __repr__(self):
         return '<id {}>'.format(self.id)
+
+class CarHistory(db.Model):
+    __tablename__ = 'cars_history'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    username = db.Column(db.String(80), nullable=False, index=True)
+    name = db.Column(db.String(50), nullable=False)
+    current_capacity = db.Column(db.Integer, nullable=False)
+    max_capacity = db.Column(db.Integer, nullable=False)
+    departure_time = db.Column(db.DateTime, nullable=False)
+    return_time = db.Column(db.DateTime, nullable=False)
+    driver_comment = db.Column(db.Text)
+    ride_id = db.Column(db.Integer, nullable=False, index=True)
+
+    def __repr__(self):
+        return '<id {}>'.format(self.id)
+
+class RiderHistory(db.Model):
+    __tablename__ = 'riders_history'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    username = db.Column(db.String(80), nullable=False, index=True)
+    name = db.Column(db.String(50), nullable=False)
+    car_id = db.Column(db.Integer, nullable=False, index=True)
+    ride_id = db.Column(db.Integer, nullable=False, index=True)
+
+    def __repr__(self):
+        return '<id {}>'.format(self.id)
+
+
+class CacheVersion(db.Model):
+    """
+    A single row counting writes to ride data, so every worker knows when its cached responses are out of date
+    and when the read replica may still be catching up, and counting changes to API keys for the key caches
+    """
+    __tablename__ = 'cache_version'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Unix time of the last write
+    changed_at = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    # API keys created and revoked
+    key_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return '<version {}>'.format(self.version)
+
+
+event.listen(CacheVersion.__table__, 'after_create', DDL("INSERT INTO cache_version (id, version) VALUES (1, 0)"))
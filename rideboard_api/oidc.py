@@ -0,0 +1,58 @@
+####################################
+# File name: oidc.py               #
+# Author: Ayush Goel               #
+####################################
+import threading
+from functools import wraps
+from flask_pyoidc.flask_pyoidc import OIDCAuthentication
+
+
+class LazyOIDCAuthentication(OIDCAuthentication):
+    """
+    OIDCAuthentication that runs provider discovery on first use instead of at import.
+    Workers start without waiting on SSO, and the API key routes work while SSO is unreachable.
+    """
+
+    def __init__(self, app, issuer: str, client_registration_info: dict):
+        # A provider configuration with only the issuer keeps the parent from running discovery now,
+        # while it still registers the redirect_uri route and the client registration.
+        super().__init__(app, client_registration_info=client_registration_info,
+                         provider_configuration_info={'issuer': issuer})
+        self.issuer = issuer
+        self.discovered = False
+        self._lock = threading.Lock()
+
+    def discover(self):
+        """
+        Fetches the provider configuration from the issuer, once
+        """
+        if self.discovered:
+            return
+        with self._lock:
+            if not self.discovered:
+                self.client.provider_config(self.issuer)
+                self.discovered = True
+
+    def oidc_auth(self, view_func):
+        protected = super().oidc_auth(view_func)
+
+        @wraps(view_func)
+        def wrapped_function(*args, **kwargs):
+            self.discover()
+            return protected(*args, **kwargs)
+
+        return wrapped_function
+
+    def oidc_logout(self, view_func):
+        logout = super().oidc_logout(view_func)
+
+        @wraps(view_func)
+        def wrapped_function(*args, **kwargs):
+            self.discover()
+            return logout(*args, **kwargs)
+
+        return wrapped_function
+
+    def _handle_authentication_response(self):
+        self.discover()
+        return super()._handle_authentication_response()
@@ -0,0 +1,349 @@
+####################################
+# File name: queries.py            #
+# Author: Ayush Goel               #
+####################################
+import base64
+import binascii
+from datetime import datetime
+from sqlalchemy import and_, func, literal, or_, select
+from sqlalchemy.orm import selectinload
+from rideboard_api import db
+from rideboard_api.models import Ride, Car, Rider, RideHistory, CarHistory, RiderHistory, CacheVersion, APIKey
+
+TIME_FORMAT = '%a, %d %b %Y %H:%M:%S'
+CURSOR_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+def ride_query():
+    """
+    Query for Rides with their cars and riders eagerly loaded.
+    Serializing any number of rides takes three statements: rides, cars, riders.
+    :return: Ride query
+    """
+    return Ride.query.options(selectinload(Ride.cars).selectinload(Car.riders))
+
+
+def car_query():
+    """
+    Query for Cars with their riders eagerly loaded.
+    :return: Car query
+    """
+    return Car.query.options(selectinload(Car.riders))
+
+
+def encode_cursor(time: datetime, last_id: int) -> str:
+    """
+    Builds an opaque cursor pointing just past the given row
+    :param time: sort time of the last row on the page
+    :param last_id: id of the last row on the page
+    :return: cursor string
+    """
+    raw = '{}|{}'.format(time.strftime(CURSOR_TIME_FORMAT), last_id)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """
+    Reads a cursor built by encode_cursor
+    :param cursor: cursor string
+    :return: tuple of (time, id)
+    """
+    try:
+        time, last_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.strptime(time, CURSOR_TIME_FORMAT), int(last_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor!")
+
+
+def parse_limit(limit) -> int:
+    """
+    Validates the page size requested by the client
+    :param limit: limit query parameter, may be None
+    :return: page size
+    """
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError("limit must be a number!")
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError("limit must be between 1 and {}!".format(MAX_PAGE_SIZE))
+    return limit
+
+
+def parse_time(value: str, name: str):
+    """
+    Parses a time query parameter in the API's time format
+    :param value: query parameter, may be None
+    :param name: name of the parameter, for the error message
+    :return: datetime or None
+    """
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, TIME_FORMAT)
+    except ValueError:
+        raise ValueError("{} must be in the format '{}'!".format(name, TIME_FORMAT))
+
+
+def is_set(args, name: str) -> bool:
+    """
+    Checks if a boolean query parameter is turned on
+    :param args: request arguments
+    :param name: name of the parameter
+    :return: true if the parameter is 'true' or '1'
+    """
+    return args.get(name, '').lower() in ('true', '1')
+
+
+def filter_rides(query, args):
+    """
+    Applies the upcoming, after, before, creator and open_seats filters to a Ride query
+    :param query: Ride query
+    :param args: request arguments
+    :return: filtered Ride query
+    """
+    if is_set(args, 'upcoming'):
+        query = query.filter(Ride.start_time >= datetime.now())
+    after = parse_time(args.get('after'), 'after')
+    if after is not None:
+        query = query.filter(Ride.start_time >= after)
+    before = parse_time(args.get('before'), 'before')
+    if before is not None:
+        query = query.filter(Ride.start_time <= before)
+    if args.get('creator') is not None:
+        query = query.filter(Ride.creator == args.get('creator'))
+    if is_set(args, 'open_seats'):
+        query = query.filter(Ride.open_seats > 0)
+    return query
+
+
+def filter_cars(query, args):
+    """
+    Applies the upcoming, after, before, username and open_seats filters to a Car query
+    :param query: Car query
+    :param args: request arguments
+    :return: filtered Car query
+    """
+    if is_set(args, 'upcoming'):
+        query = query.filter(Car.departure_time >= datetime.now())
+    after = parse_time(args.get('after'), 'after')
+    if after is not None:
+        query = query.filter(Car.departure_time >= after)
+    before = parse_time(args.get('before'), 'before')
+    if before is not None:
+        query = query.filter(Car.departure_time <= before)
+    if args.get('username') is not None:
+        query = query.filter(Car.username == args.get('username'))
+    if is_set(args, 'open_seats'):
+        query = query.filter(Car.current_capacity < Car.max_capacity)
+    return query
+
+
+def paginate(query, time_column, id_column, args):
+    """
+    Orders a query by (time, id) and applies keyset pagination if a cursor or limit was requested.
+    :param query: query to paginate
+    :param time_column: column to sort on
+    :param id_column: primary key column, used to break ties
+    :param args: request arguments
+    :return: tuple of (rows, cursor for the next page or None)
+    """
+    query = query.order_by(time_column.asc(), id_column.asc())
+    cursor = args.get('cursor')
+    limit = args.get('limit')
+    if cursor is None and limit is None:
+        return query.all(), None
+    if cursor is not None:
+        time, last_id = decode_cursor(cursor)
+        query = query.filter(or_(time_column > time, and_(time_column == time, id_column > last_id)))
+    limit = parse_limit(limit)
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(getattr(rows[-1], time_column.key), getattr(rows[-1], id_column.key))
+
+
+def adjust_open_seats(ride_id, delta: int):
+    """
+    Atomically changes the open_seats count of a Ride as part of the current transaction
+    :param ride_id: id of the Ride
+    :param delta: number of seats freed (positive) or taken (negative)
+    """
+    if delta:
+        Ride.query.filter(Ride.id == ride_id).update({Ride.open_seats: Ride.open_seats + delta},
+                                                     synchronize_session=False)
+
+
+def reconcile_open_seats() -> int:
+    """
+    Recomputes open_seats for every Ride from its cars in a single statement
+    :return: number of rides updated
+    """
+    seats = select([func.coalesce(func.sum(Car.max_capacity - Car.current_capacity), 0)]) \
+        .where(and_(Car.ride_id == Ride.id, Car.max_capacity > 0)).as_scalar()
+    updated = Ride.query.update({Ride.open_seats: seats}, synchronize_session=False)
+    commit_changes()
+    return updated
+
+
+def read_cache_version() -> tuple:
+    """
+    Reads the cache versions shared by every worker, always from the primary database
+    :return: tuple of (number of writes counted so far, Unix time of the last write, number of key changes)
+    """
+    row = db.session.execute(select([CacheVersion.version, CacheVersion.changed_at, CacheVersion.key_version])
+                             .where(CacheVersion.id == 1), bind=db.engine).first()
+    return (row.version, row.changed_at, row.key_version) if row is not None else (0, 0.0, 0)
+
+
+def bump_key_version():
+    """
+    Counts an API key created or revoked as part of the current transaction,
+    so every worker drops the key verifications it cached before the change
+    """
+    db.session.execute(CacheVersion.__table__.update().where(CacheVersion.id == 1)
+                       .values(key_version=CacheVersion.key_version + 1))
+
+
+def key_digests(prefix: str) -> list:
+    """
+    Loads the digests of the keys sharing a prefix, always from the primary database,
+    so a key created a moment ago is found even when the replica hasn't caught up
+    :param prefix: the part of a key stored in the clear
+    :return: list of digests
+    """
+    rows = db.session.execute(select([APIKey.digest]).where(APIKey.prefix == prefix), bind=db.engine)
+    return [row.digest for row in rows]
+
+
+def commit_changes():
+    """
+    Commits a write to ride data together with a bump of the shared cache version, in one transaction,
+    so every worker drops the responses built before it. The version row is updated last to hold its lock briefly.
+    A reader that still sees the old version can only store what it built under that old version.
+    """
+    db.session.execute(CacheVersion.__table__.update().where(CacheVersion.id == 1)
+                       .values(version=CacheVersion.version + 1, changed_at=datetime.now().timestamp()))
+    db.session.commit()
+
+
+def user_cars(username: str, ride_id=None) -> list:
+    """
+    Finds the cars a user drives or rides in, in a single query on the username indexes
+    :param username: username
+    :param ride_id: only look in this Ride
+    :return: list of (ride_id, car_id, role) with role 'driver' or 'rider', ordered by ride
+    """
+    driving = db.session.query(Car.ride_id.label('ride_id'), Car.id.label('car_id'),
+                               literal('driver').label('role')).filter(Car.username == username)
+    riding = db.session.query(Rider.ride_id.label('ride_id'), Rider.car_id.label('car_id'),
+                              literal('rider').label('role')).filter(Rider.username == username)
+    if ride_id is not None:
+        driving = driving.filter(Car.ride_id == ride_id)
+        riding = riding.filter(Rider.ride_id == ride_id)
+    return sorted(tuple(row) for row in driving.union_all(riding).all())
+
+
+def in_ride(ride_id, username: str) -> bool:
+    """
+    Checks in a single query if the user drives or rides in any car of a Ride
+    :param ride_id: id of the Ride
+    :param username: username
+    :return: true if the user is already in a car of the Ride
+    """
+    return bool(user_cars(username, ride_id))
+
+
+def reserve_seat(car_id) -> bool:
+    """
+    Atomically takes a seat in a Car if one is free, as part of the current transaction
+    :param car_id: id of the Car
+    :return: true if a seat was reserved
+    """
+    reserved = Car.query.filter(Car.id == car_id,
+                                or_(Car.current_capacity < Car.max_capacity, Car.max_capacity == 0)) \
+        .update({Car.current_capacity: Car.current_capacity + 1}, synchronize_session=False)
+    return reserved == 1
+
+
+def release_seat(car_id):
+    """
+    Atomically frees a seat in a Car, as part of the current transaction
+    :param car_id: id of the Car
+    """
+    Car.query.filter(Car.id == car_id, Car.current_capacity > 0) \
+        .update({Car.current_capacity: Car.current_capacity - 1}, synchronize_session=False)
+
+
+def add_rider(car: Car, username: str, name: str) -> bool:
+    """
+    Puts a user in a Car as part of the current transaction.
+    The seat is taken with a conditional UPDATE and the unique_rider constraint rejects a second
+    car in the same event, so concurrent joins can't overbook a car.
+    :param car: the Car to join
+    :param username: username
+    :param name: full name of the user
+    :return: true if the user joined, false if the car is full or the user is already in the Ride
+    """
+    if in_ride(car.ride_id, username) or not reserve_seat(car.id):
+        return False
+    if car.max_capacity > 0:
+        adjust_open_seats(car.ride_id, -1)
+    db.session.add(Rider(username, name, car.id, car.ride_id))
+    return True
+
+
+def remove_rider(ride_id, username: str):
+    """
+    Takes a user out of the car they ride in, as part of the current transaction
+    :param ride_id: id of the Ride
+    :param username: username
+    :return: id of the Car the user left, or None if they weren't a rider in the Ride
+    """
+    riding = [car_id for _, car_id, role in user_cars(username, ride_id) if role == 'rider']
+    # Checking the deleted row count keeps two concurrent leaves from freeing two seats
+    if not riding or not Rider.query.filter(Rider.ride_id == ride_id, Rider.username == username) \
+            .delete(synchronize_session=False):
+        return None
+    car = Car.query.filter(Car.id == riding[0]).first()
+    release_seat(car.id)
+    if car.max_capacity > 0:
+        adjust_open_seats(car.ride_id, 1)
+    return car.id
+
+
+def remove_rides(condition, archive=False) -> int:
+    """
+    Deletes the Rides matching a condition with their cars and riders, in a constant number of statements.
+    :param condition: SQL expression on Ride selecting the rides to remove
+    :param archive: copy the rows to the history tables before deleting them
+    :return: number of rides removed
+    """
+    ride_ids = select([Ride.id]).where(condition)
+    # Children first, so the foreign keys hold after every statement
+    tables = ((Rider, RiderHistory, Rider.ride_id.in_(ride_ids)),
+              (Car, CarHistory, Car.ride_id.in_(ride_ids)),
+              (Ride, RideHistory, condition))
+    if archive:
+        for model, history, where in reversed(tables):
+            columns = [column.name for column in model.__table__.columns]
+            db.session.execute(history.__table__.insert().from_select(
+                columns, select([model.__table__.c[name] for name in columns]).where(where)))
+    removed = 0
+    for model, _, where in tables:
+        removed = model.query.filter(where).delete(synchronize_session=False)
+    return removed
+
+
+def remove_car(car_id):
+    """
+    Deletes a Car and its riders in two statements
+    :param car_id: id of the Car
+    """
+    Rider.query.filter(Rider.car_id == car_id).delete(synchronize_session=False)
+    Car.query.filter(Car.id == car_id).delete(synchronize_session=False)
@@ -0,0 +1,161 @@
+####################################
+# File name: ratelimit.py          #
+# Author: Ayush Goel               #
+####################################
+import math
+import threading
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class RateLimited(Exception):
+    """
+    Raised when an API key has used up its requests.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__("Rate limit exceeded")
+        self.retry_after = retry_after
+
+
+class MemoryStorage:
+    """
+    Token buckets and usage counters kept in this process. Each worker limits keys separately.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._usage = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int):
+        """
+        Takes a token from the key's bucket
+        :param key: API key
+        :param rate: tokens added per second
+        :param burst: size of the bucket
+        :return: tuple of (true if a token was taken, tokens left)
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - last) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            return allowed, tokens
+
+    def count(self, key: str, counter: str):
+        """
+        Increments one of the key's usage counters
+        :param key: API key
+        :param counter: 'requests' or 'throttled'
+        """
+        with self._lock:
+            usage = self._usage.setdefault(key, {'requests': 0, 'throttled': 0})
+            usage[counter] += 1
+
+    def usage(self, keys: list) -> dict:
+        """
+        Reads the usage counters of several keys
+        :param keys: API keys
+        :return: dict of key to its counters
+        """
+        with self._lock:
+            return {key: dict(self._usage.get(key, {'requests': 0, 'throttled': 0})) for key in keys}
+
+
+class RedisStorage:
+    """
+    Token buckets and usage counters kept in Redis, shared by every worker.
+    """
+
+    TAKE_SCRIPT = """
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'last')
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local tokens, last = tonumber(bucket[1]), tonumber(bucket[2])
+    if tokens == nil then
+        tokens, last = burst, now
+    end
+    tokens = math.min(burst, tokens + math.max(0, now - last) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HMSET', KEYS[1], 'tokens', tostring(tokens), 'last', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url: str, prefix='rideboard:'):
+        if redis is None:
+            raise ValueError("RATE_LIMIT_STORAGE is a Redis URL, but the redis package is not installed")
+        self.client = redis.StrictRedis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(self.TAKE_SCRIPT)
+
+    def take(self, key: str, rate: float, burst: int):
+        allowed, tokens = self._take(keys=[self.prefix + 'bucket:' + key], args=[rate, burst, time.time()])
+        return bool(allowed), float(tokens)
+
+    def count(self, key: str, counter: str):
+        self.client.hincrby(self.prefix + 'usage:' + key, counter, 1)
+
+    def usage(self, keys: list) -> dict:
+        pipeline = self.client.pipeline()
+        for key in keys:
+            pipeline.hgetall(self.prefix + 'usage:' + key)
+        return {key: {'requests': int(usage.get(b'requests', 0)), 'throttled': int(usage.get(b'throttled', 0))}
+                for key, usage in zip(keys, pipeline.execute())}
+
+
+class RateLimiter:
+    """
+    Per API key token bucket rate limiting with usage accounting.
+    """
+
+    def __init__(self, storage, rate=10.0, burst=50):
+        self.storage = storage
+        self.rate = rate
+        self.burst = burst
+
+    def hit(self, key: str):
+        """
+        Records a request made with a key, raising RateLimited if the key has no requests left
+        :param key: API key
+        """
+        if self.rate <= 0:
+            self.storage.count(key, 'requests')
+            return
+        allowed, tokens = self.storage.take(key, self.rate, self.burst)
+        if not allowed:
+            self.storage.count(key, 'throttled')
+            raise RateLimited(max(1, math.ceil((1 - tokens) / self.rate)))
+        self.storage.count(key, 'requests')
+
+    def usage(self, keys: list) -> dict:
+        """
+        Reads the usage counters of several keys
+        :param keys: API keys
+        :return: dict of key to its 'requests' and 'throttled' counters
+        """
+        return self.storage.usage(keys)
+
+
+def create_storage(url: str):
+    """
+    Builds the storage backend named by the RATE_LIMIT_STORAGE setting
+    :param url: 'memory' or a redis:// URL
+    :return: storage backend
+    """
+    if url == 'memory':
+        return MemoryStorage()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStorage(url)
+    raise ValueError("Unknown RATE_LIMIT_STORAGE '{}'".format(url))
@@ -0,0 +1,100 @@
+####################################
+# File name: serializers.py        #
+# Author: Ayush Goel               #
+####################################
+import json
+from datetime import date, datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def http_date(value: datetime) -> str:
+    """
+    Formats a datetime the way Flask's jsonify does, e.g. 'Thu, 02 Aug 2018 06:13:00 GMT'
+    :param value: naive datetime in UTC
+    :return: formatted date
+    """
+    if value.tzinfo is not None:
+        value = datetime(*value.utctimetuple()[:6])
+    return '{}, {:02d} {} {:04d} {:02d}:{:02d}:{:02d} GMT'.format(
+        DAYS[value.weekday()], value.day, MONTHS[value.month - 1], value.year, value.hour, value.minute, value.second)
+
+
+def iso_date(value: date) -> str:
+    """
+    Formats a datetime as ISO-8601, e.g. '2018-08-02T06:13:00'
+    :param value: datetime
+    :return: formatted date
+    """
+    return value.isoformat()
+
+
+class Serializer:
+    """
+    Compact JSON encoder using orjson when it is installed and the standard library otherwise.
+    """
+
+    def __init__(self, backend='auto', datetime_format='http'):
+        self.configure(backend, datetime_format)
+
+    def configure(self, backend: str, datetime_format: str):
+        """
+        Switches the encoder and datetime format
+        :param backend: 'auto', 'orjson' or 'json'
+        :param datetime_format: 'http' or 'iso'
+        """
+        if backend not in ('auto', 'orjson', 'json'):
+            raise ValueError("Unknown JSON backend '{}'".format(backend))
+        if datetime_format not in ('http', 'iso'):
+            raise ValueError("Unknown datetime format '{}'".format(datetime_format))
+        if backend == 'orjson' and orjson is None:
+            raise ValueError("The orjson JSON backend is not installed")
+        self.backend = 'orjson' if backend != 'json' and orjson is not None else 'json'
+        self.datetime_format = datetime_format
+        self._format_date = iso_date if datetime_format == 'iso' else http_date
+
+    def default(self, value):
+        if isinstance(value, date):
+            return self._format_date(value)
+        raise TypeError("{} is not JSON serializable".format(type(value).__name__))
+
+    def dumps(self, data) -> bytes:
+        """
+        Encodes data as compact JSON
+        :param data: JSON serializable data, may contain datetimes
+        :return: UTF-8 encoded JSON
+        """
+        if self.backend == 'orjson':
+            if self.datetime_format == 'iso':
+                return orjson.dumps(data, default=self.default)
+            return orjson.dumps(data, default=self.default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        return json.dumps(data, default=self.default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def parse_fields(fields: str):
+    """
+    Reads the fields query parameter
+    :param fields: comma separated field names, may be None
+    :return: set of field names, or None to return every field
+    """
+    if not fields:
+        return None
+    return {field.strip() for field in fields.split(',') if field.strip()}
+
+
+def project(data: dict, fields) -> dict:
+    """
+    Keeps only the requested fields of a dict
+    :param data: dict being returned
+    :param fields: set of field names, or None to keep every field
+    :return: projected dict
+    """
+    if fields is None:
+        return data
+    return {key: value for key, value in data.items() if key in fields}
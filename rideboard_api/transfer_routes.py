@@ -0,0 +1,75 @@
+####################################
+# File name: transfer_routes.py    #
+# Author: Ayush Goel               #
+####################################
+from flask import Response, request, stream_with_context
+from flask_cors import cross_origin
+from sqlalchemy.exc import IntegrityError
+from rideboard_api import app, db, check_key, data_changed, json_response, return_event_json, serializer
+from rideboard_api.analytics import CONTENT_TYPES, export_table
+from rideboard_api.bulk import import_events, read_ndjson, export_events
+from rideboard_api.queries import is_set
+
+
+@app.route('/<api_key>/import', methods=['POST'])
+@cross_origin(headers=['Content-Type'])
+def import_data(api_key: str):
+    """
+    Creates many events, with their cars and riders, in a single transaction.
+    Accepts a JSON list or newline delimited JSON (application/x-ndjson), one event per line.
+    :param api_key: API key allowing for the use of the API
+    :return: ids of the new events and the number of rows created, or 400 if any event is invalid
+    """
+    if check_key(api_key):
+        try:
+            if request.mimetype == 'application/x-ndjson':
+                events = read_ndjson(request.stream)
+            else:
+                events = request.get_json()
+                if not isinstance(events, list):
+                    return "Expected a JSON list of events!", 400
+            result = import_events(events)
+        except ValueError as e:
+            db.session.rollback()
+            return str(e), 400
+        except IntegrityError:
+            db.session.rollback()
+            return "A user can only be in one car per event!", 400
+        data_changed('rides_imported', {'ride_ids': result['ride_ids']})
+        return json_response(result)
+    return "Invalid API Key!", 403
+
+
+@app.route('/<api_key>/export', methods=['GET'])
+@cross_origin(headers=['Content-Type'])
+def export_data(api_key: str):
+    """
+    Streams every event, with its cars and riders, as newline delimited JSON
+    :param api_key: API key allowing for the use of the API
+    :return: application/x-ndjson response, one event per line
+    """
+    if check_key(api_key):
+        return Response(stream_with_context(export_events(lambda ride: serializer.dumps(return_event_json(ride)))),
+                        mimetype='application/x-ndjson')
+    return "Invalid API Key!", 403
+
+
+@app.route('/<api_key>/export/<table>', methods=['GET'])
+@cross_origin(headers=['Content-Type'])
+def export_analytics(api_key: str, table: str):
+    """
+    Streams one table as CSV, or as Arrow or Parquet with ?format= when pyarrow is installed.
+    seats has the seats offered and filled per event; ?history=true exports the archived rides instead.
+    :param api_key: API key allowing for the use of the API
+    :param table: rides, cars, riders or seats
+    :return: the table in the requested format, or 400 for an unknown table or format
+    """
+    if check_key(api_key):
+        export_format = request.args.get('format', 'csv')
+        try:
+            chunks = export_table(table, export_format, is_set(request.args, 'history'))
+        except ValueError as e:
+            return str(e), 400
+        return Response(stream_with_context(chunks), mimetype=CONTENT_TYPES[export_format],
+                        headers={'Content-Disposition': 'attachment; filename={}.{}'.format(table, export_format)})
+    return "Invalid API Key!", 403
@@ -0,0 +1,34 @@
+"""
+Fixtures shared by the tests. The app is built once at import, so every test runs against the same
+throwaway SQLite database.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+# pylint: disable=import-error,wrong-import-position
+from sandbox import prepare, load_app
+
+
+@pytest.fixture(scope='session')
+def app():
+    db_path = prepare()
+    rideboard_api = load_app()
+    with rideboard_api.app.app_context():
+        rideboard_api.db.create_all()
+    yield rideboard_api.app
+    os.unlink(db_path)
+
+
+@pytest.fixture(scope='session')
+def api_key(app):
+    # pylint: disable=redefined-outer-name
+    from rideboard_api import db
+    from rideboard_api.models import APIKey
+    with app.app_context():
+        key = APIKey('test', 'conftest.py')
+        db.session.add(key)
+        db.session.commit()
+        return key.key
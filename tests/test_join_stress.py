@@ -0,0 +1,98 @@
+"""
+Parallel joins never overbook a car, and never put a user in two cars of the same event.
+"""
+import threading
+from datetime import datetime, timedelta
+
+THREADS = 16
+USERS = 100
+SEATS = 5
+
+
+def create_ride(app, cars: int) -> tuple:
+    """
+    Creates a ride with cars of SEATS seats each
+    :return: tuple of (ride id, ids of the cars)
+    """
+    from rideboard_api import db
+    from rideboard_api.models import Ride, Car
+    start = datetime.now() + timedelta(days=1)
+    with app.app_context():
+        ride = Ride('Stress Test', 'Nowhere', start, start + timedelta(hours=2), 'stress')
+        db.session.add(ride)
+        db.session.flush()
+        new_cars = [Car('driver{}'.format(i), 'Driver', 0, SEATS, start, start, '', ride.id) for i in range(cars)]
+        db.session.add_all(new_cars)
+        ride.open_seats = SEATS * cars
+        db.session.commit()
+        return ride.id, [car.id for car in new_cars]
+
+
+def join_in_parallel(app, api_key: str, joins: list) -> dict:
+    """
+    Sends every (car id, username) join from THREADS threads, released two at a time so they overlap
+    :return: number of responses per status code
+    """
+    statuses = {}
+    lock = threading.Lock()
+    barrier = threading.Barrier(2)
+    pending = list(reversed(joins))
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                if not pending:
+                    return
+                car_id, username = pending.pop()
+            try:
+                barrier.wait(timeout=1)
+            except threading.BrokenBarrierError:
+                barrier.reset()
+            status = client.put('/{}/join/{}/{}/First/Last'.format(api_key, car_id, username)).status_code
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+
+def seat_counts(app, ride_id: int, car_id: int) -> tuple:
+    from rideboard_api.models import Ride, Car, Rider
+    with app.app_context():
+        car = Car.query.get(car_id)
+        riders = Rider.query.filter(Rider.car_id == car_id).count()
+        return riders, car.current_capacity, car.max_capacity, Ride.query.get(ride_id).open_seats
+
+
+def test_parallel_joins_never_overbook(app, api_key):
+    ride_id, (car_id,) = create_ride(app, 1)
+    statuses = join_in_parallel(app, api_key, [(car_id, 'user{}'.format(i)) for i in range(USERS)] * 2)
+    assert statuses == {200: SEATS, 400: USERS * 2 - SEATS}
+    riders, current_capacity, max_capacity, open_seats = seat_counts(app, ride_id, car_id)
+    assert riders == current_capacity == max_capacity
+    assert open_seats == 0
+
+
+def test_parallel_joins_of_two_cars(app, api_key, monkeypatch):
+    import rideboard_api.queries
+    from rideboard_api.models import Rider
+    # Let every join past the in_ride check, as if both joins of a user read before either wrote,
+    # so only the unique_rider constraint keeps a user out of the second car
+    monkeypatch.setattr(rideboard_api.queries, 'in_ride', lambda ride_id, username: False)
+    ride_id, car_ids = create_ride(app, 2)
+    users = ['twice{}'.format(i) for i in range(SEATS)]
+    statuses = join_in_parallel(app, api_key, [(car_id, username) for username in users for car_id in car_ids])
+    assert statuses == {200: SEATS, 400: SEATS}
+    with app.app_context():
+        for username in users:
+            assert Rider.query.filter(Rider.ride_id == ride_id, Rider.username == username).count() == 1
+    counts = [seat_counts(app, ride_id, car_id) for car_id in car_ids]
+    for riders, current_capacity, _, _ in counts:
+        assert riders == current_capacity
+    assert sum(riders for riders, _, _, _ in counts) == SEATS
+    assert counts[0][3] == SEATS
@@ -0,0 +1,39 @@
+"""
+API keys created or revoked by one worker are seen by every worker, despite their key caches.
+"""
+NEW_KEY = '0123456789abcdef0123456789abcdef'
+
+
+def test_revoked_key_is_rejected(app):
+    from rideboard_api import db
+    from rideboard_api.models import APIKey
+    from rideboard_api.queries import bump_key_version
+    with app.app_context():
+        key = APIKey('test', 'test_revoked_key_is_rejected')
+        db.session.add(key)
+        db.session.commit()
+        api_key, key_id = key.key, key.id
+    client = app.test_client()
+    assert client.get('/{}/get/car'.format(api_key)).status_code == 200
+    # Revoked as /revokekey does on another worker, which leaves this worker's cached verification in place
+    with app.app_context():
+        db.session.execute(APIKey.__table__.delete().where(APIKey.id == key_id))
+        bump_key_version()
+        db.session.commit()
+    assert client.get('/{}/get/car'.format(api_key)).status_code == 403
+
+
+def test_new_key_is_accepted(app, monkeypatch):
+    import rideboard_api.models
+    from rideboard_api import db
+    from rideboard_api.models import APIKey
+    from rideboard_api.queries import bump_key_version
+    client = app.test_client()
+    assert client.get('/{}/get/car'.format(NEW_KEY)).status_code == 403
+    monkeypatch.setattr(rideboard_api.models, 'generate_key', lambda: NEW_KEY)
+    # Created as /generatekey does on another worker, after this worker cached the key as invalid
+    with app.app_context():
+        db.session.add(APIKey('test', 'test_new_key_is_accepted'))
+        bump_key_version()
+        db.session.commit()
+    assert client.get('/{}/get/car'.format(NEW_KEY)).status_code == 200
@@ -0,0 +1,71 @@
+"""
+The read routes load rides, cars and riders in a fixed number of statements, however many rides there are.
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+TIME_FORMAT = '%a, %d %b %Y %H:%M:%S'
+# Small enough that selectinload fetches the children of every ride in one IN query
+RIDES = 10
+
+
+@pytest.fixture(scope='module')
+def statements(app):
+    # pylint: disable=redefined-outer-name,unused-argument
+    from sqlalchemy import event as sa_event
+    from sqlalchemy.engine import Engine
+    import rideboard_api
+
+    ttls = rideboard_api.response_cache.ttl, rideboard_api.upcoming_cache.ttl
+    rideboard_api.response_cache.ttl = rideboard_api.upcoming_cache.ttl = 0
+    executed = []
+
+    def count(*args):
+        executed.append(args[2])
+
+    sa_event.listen(Engine, 'after_cursor_execute', count)
+    yield executed
+    sa_event.remove(Engine, 'after_cursor_execute', count)
+    rideboard_api.response_cache.ttl, rideboard_api.upcoming_cache.ttl = ttls
+
+
+def seed(app, first: int, count: int):
+    from rideboard_api.bulk import import_events
+    start = datetime.now() + timedelta(days=1)
+    with app.app_context():
+        import_events([{
+            'name': 'Event {}'.format(index),
+            'address': 'Address',
+            'start_time': (start + timedelta(hours=index)).strftime(TIME_FORMAT),
+            'end_time': (start + timedelta(hours=index + 2)).strftime(TIME_FORMAT),
+            'creator': 'creator',
+            'cars': [{
+                'name': 'Driver', 'username': 'driver{}'.format(index), 'max_capacity': 3,
+                'departure_time': start.strftime(TIME_FORMAT), 'return_time': start.strftime(TIME_FORMAT),
+                'riders': ['rider{}-{}'.format(index, rider) for rider in range(2)]
+            }]
+        } for index in range(first, first + count)])
+
+
+def statement_counts(app, api_key: str, statements: list) -> dict:
+    client = app.test_client()
+    counts = {}
+    for route in ('all', 'get/car', 'upcoming'):
+        del statements[:]
+        response = client.get('/{}/{}'.format(api_key, route))
+        assert response.status_code == 200
+        json.loads(response.data.decode())
+        counts[route] = len(statements)
+    return counts
+
+
+def test_statement_count_is_constant(app, api_key, statements):
+    seed(app, 0, RIDES)
+    # Warm the key cache, so every measured request checks the key the same way
+    statement_counts(app, api_key, statements)
+    small = statement_counts(app, api_key, statements)
+    seed(app, RIDES, RIDES * 9)
+    large = statement_counts(app, api_key, statements)
+    assert small == large
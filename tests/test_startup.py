@@ -0,0 +1,37 @@
+"""
+Workers start without reaching the SSO provider, and settings passed to create_app take effect.
+"""
+import os
+import subprocess
+import sys
+import time
+
+from sandbox import ROOT
+
+# Longer than an import takes, far shorter than a connection timeout to an address that never answers
+IMPORT_SECONDS = 10
+
+
+def test_import_does_not_reach_oidc_issuer(tmpdir):
+    env = dict(os.environ,
+               SQLALCHEMY_DATABASE_URI='sqlite:///' + str(tmpdir.join('startup.db')),
+               OIDC_ISSUER='http://10.255.255.1/auth/realms/csh')
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import rideboard_api'], cwd=ROOT, env=env, check=True,
+                   timeout=IMPORT_SECONDS * 3)
+    assert time.perf_counter() - start < IMPORT_SECONDS
+
+
+def test_create_app_overrides(app):
+    import rideboard_api
+    from rideboard_api import create_app
+    settings = {name: app.config.get(name) for name in ('RESPONSE_CACHE_TTL', 'KEY_CACHE_SIZE', 'JSON_DATETIME_FORMAT')}
+    try:
+        create_app(RESPONSE_CACHE_TTL=7, KEY_CACHE_SIZE=3, JSON_DATETIME_FORMAT='iso')
+        assert rideboard_api.response_cache.ttl == 7
+        assert rideboard_api.key_cache.max_size == 3
+        assert rideboard_api.serializer.datetime_format == 'iso'
+    finally:
+        create_app(**settings)
+    assert rideboard_api.response_cache.ttl == settings['RESPONSE_CACHE_TTL']
+
@@ -0,0 +1,29 @@
+"""
+/upcoming stops returning an event as soon as it starts, with the caches on.
+"""
+import json
+import time
+from datetime import datetime, timedelta
+
+
+def test_started_event_is_not_upcoming(app, api_key):
+    from rideboard_api import db, data_changed
+    from rideboard_api.models import Ride
+    from rideboard_api.queries import commit_changes
+    start = datetime.now().replace(microsecond=0) + timedelta(seconds=2)
+    with app.app_context():
+        later = Ride('Later', 'Nowhere', start + timedelta(days=365), start + timedelta(days=366), 'test')
+        soon = Ride('Soon', 'Nowhere', start, start + timedelta(hours=1), 'test')
+        db.session.add_all([later, soon])
+        commit_changes()
+        soon_id = soon.id
+        data_changed('ride_created', {})
+    client = app.test_client()
+    response = client.get('/{}/upcoming'.format(api_key))
+    assert json.loads(response.data.decode())['id'] == soon_id
+    etag = response.headers['ETag']
+    assert client.get('/{}/upcoming'.format(api_key), headers={'If-None-Match': etag}).status_code == 304
+    time.sleep(max(0.0, (start - datetime.now()).total_seconds()) + 0.1)
+    response = client.get('/{}/upcoming'.format(api_key), headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert json.loads(response.data.decode())['id'] != soon_id
@@ -0,0 +1,22 @@
+import argparse
+import logging
+from rideboard_api import create_app
+from rideboard_api.jobs import maintenance_jobs
+
+app = create_app()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs the background jobs: archiving ended rides and "
+                                                 "recomputing open seat counts.")
+    parser.add_argument('--once', action='store_true', help="run every job once and exit")
+    args = parser.parse_args()
+    app.logger.addHandler(logging.StreamHandler())
+    app.logger.setLevel(logging.INFO)
+    runner = maintenance_jobs(app)
+    if args.once:
+        runner.run_pending()
+    else:
+        try:
+            runner.run_forever()
+        except KeyboardInterrupt:
+            runner.stop()